@@ -1,5 +1,7 @@
 import base64
-from typing import List
+import itertools
+import shlex
+from typing import Dict
 import pulumi
 import pulumi_aws as aws
 from mail import SimpleEmailService
@@ -10,116 +12,17 @@ import webapp
 import rqlite
 import redis
 import reverse_proxy
-import urllib.parse
-import ipaddress
+from stack_config import StackConfig
+import re
 import os
 
-if os.environ.get("AWS_PROFILE") is None or "oseh" not in os.environ.get("AWS_PROFILE"):
+aws_profile = os.environ.get("AWS_PROFILE")
+if aws_profile is None or "oseh" not in aws_profile:
     raise Exception(
         "AWS_PROFILE must be set to an oseh profile to avoid accidentally using wrong AWS account"
     )
 
-config = pulumi.Config()
-github_username = config.require("github_username")
-github_pat = config.require_secret("github_pat")
-domain = config.require("domain")
-rqlite_id_offset = config.get_int("rqlite_id_offset")
-if rqlite_id_offset is None:
-    rqlite_id_offset = 0
-deployment_secret = config.require_secret("deployment_secret")
-slack_web_errors_url = config.require_secret("slack_web_errors_url")
-slack_ops_url = config.require_secret("slack_ops_url")
-slack_oseh_bot_url = config.require_secret("slack_oseh_bot_url")
-slack_oseh_classes_url = config.require_secret("slack_oseh_classes_url")
-google_oidc_client_id = config.require("google_oidc_client_id")
-google_oidc_client_secret = config.require_secret("google_oidc_client_secret")
-expo_username = config.require("expo_username")
-expo_app_slug = config.require("expo_app_slug")
-development_expo_urls = [
-    u for u in config.get("development_expo_urls", default="").split(",") if u != ""
-]
-webapp_counter = config.get_int("webapp_counter")
-"""the webapp counter doesn't do anything, but changing it will rebuild all the webapps--useful for testing"""
-apple_app_id_team_id = config.require("apple_app_id_team_id")
-apple_services_id = config.require("apple_services_id")
-apple_key_id = config.require("apple_key_id")
-apple_key_file = config.require("apple_key_file")
-image_file_jwt_secret = config.require_secret("image_file_jwt_secret")
-file_upload_jwt_secret = config.require_secret("file_upload_jwt_secret")
-content_file_jwt_secret = config.require_secret("content_file_jwt_secret")
-journey_jwt_secret = config.require_secret("journey_jwt_secret")
-daily_event_jwt_secret = config.require_secret("daily_event_jwt_secret")
-interactive_prompt_jwt_secret = config.require_secret("interactive_prompt_jwt_secret")
-id_token_secret = config.require_secret("id_token_secret")
-refresh_token_secret = config.require_secret("refresh_token_secret")
-course_jwt_secret = config.require_secret("course_jwt_secret")
-revenue_cat_secret_key = config.require_secret("revenue_cat_secret_key")
-revenue_cat_stripe_public_key = config.require_secret("revenue_cat_stripe_public_key")
-revenue_cat_google_play_public_key = config.require_secret(
-    "revenue_cat_google_play_public_key"
-)
-revenue_cat_apple_public_key = config.require_secret("revenue_cat_apple_public_key")
-stripe_secret_key = config.require_secret("stripe_secret_key")
-stripe_public_key = config.require_secret("stripe_public_key")
-stripe_price_id = config.require("stripe_price_id")
-twilio_account_sid = config.require("twilio_account_sid")
-twilio_auth_token = config.require_secret("twilio_auth_token")
-twilio_phone_number = config.require("twilio_phone_number")
-twilio_verify_service_sid = config.require("twilio_verify_service_sid")
-twilio_message_service_sid = config.require("twilio_message_service_sid")
-klaviyo_api_key = config.require_secret("klaviyo_api_key")
-oseh_openai_api_key = config.require_secret("oseh_openai_api_key")
-oseh_pexels_api_key = config.require_secret("oseh_pexels_api_key")
-oseh_stability_ai_key = config.require_secret("oseh_stability_ai_key")
-oseh_play_ht_user_id = config.require("oseh_play_ht_user_id")
-oseh_play_ht_api_key = config.require_secret("oseh_play_ht_api_key")
-oseh_reddit_client_id = config.require_secret("oseh_reddit_client_id")
-oseh_reddit_client_secret = config.require_secret("oseh_reddit_client_secret")
-oseh_mastodon_client_id = config.require_secret("oseh_mastodon_client_id")
-oseh_mastodon_client_secret = config.require_secret("oseh_mastodon_client_secret")
-oseh_mastodon_access_token = config.require_secret("oseh_mastodon_access_token")
-oseh_direct_account_client_id = config.require_secret("oseh_direct_account_client_id")
-oseh_direct_account_client_secret = config.require_secret(
-    "oseh_direct_account_client_secret"
-)
-oseh_direct_account_redirect_path = config.require("oseh_direct_account_redirect_path")
-oseh_direct_account_jwt_secret = config.require_secret("oseh_direct_account_jwt_secret")
-oseh_csrf_jwt_secret_web = config.require_secret("oseh_csrf_jwt_secret_web")
-oseh_csrf_jwt_secret_native = config.require_secret("oseh_csrf_jwt_secret_native")
-oseh_expo_notification_access_token = config.require_secret(
-    "oseh_expo_notification_access_token"
-)
-oseh_email_template_jwt_secret = config.require_secret("oseh_email_template_jwt_secret")
-oseh_siwo_jwt_secret = config.require_secret("oseh_siwo_jwt_secret")
-oseh_merge_jwt_secret = config.require_secret("oseh_merge_jwt_secret")
-oseh_transcript_jwt_secret = config.require_secret("oseh_transcript_jwt_secret")
-oseh_progress_jwt_secret = config.require_secret("oseh_progress_jwt_secret")
-revenue_cat_v2_secret_key = config.require_secret("revenue_cat_v2_secret_key")
-oseh_gender_api_key = config.require_secret("oseh_gender_api_key")
-oseh_client_screen_jwt_secret = config.require_secret("oseh_client_screen_jwt_secret")
-oseh_journal_jwt_secret = config.require_secret("oseh_journal_jwt_secret")
-oseh_voice_note_jwt_secret = config.require_secret("oseh_voice_note_jwt_secret")
-
-# it's easy to misuse development_expo_urls, so we make sure it's valid
-for idx, url_str in enumerate(development_expo_urls):
-    url = urllib.parse.urlparse(url_str)
-    assert (
-        url.scheme == "exp"
-    ), f"development_expo_urls[{idx}]: expected {url_str=} scheme to be exp, got {url.scheme=}"
-    assert (
-        url.port == 19000
-    ), f"development_expo_urls[{idx}]: expected {url_str=} port to be 19000, got {url.port=}"
-    try:
-        ip = ipaddress.ip_address(url.hostname)
-    except:
-        assert (
-            False
-        ), f"development_expo_urls[{idx}]: expected {url_str=} hostname to be an IP address, got {url.hostname=}"
-
-    assert (
-        ip.is_private
-    ), f"development_expo_urls[{idx}]: expected {url_str=} hostname to be private, got {url.hostname=}"
-
+cfg = StackConfig.load(pulumi.Config())
 
 key = Key("key", "key.pub", "key.openssh")
 
@@ -143,7 +46,7 @@ main_vpc = vpc.VirtualPrivateCloud("main_vpc", key)
 main_rqlite = rqlite.RqliteCluster(
     "main_rqlite",
     main_vpc,
-    id_offset=rqlite_id_offset,
+    id_offset=cfg.rqlite_id_offset,
     allow_maintenance_subnet_idx=None,
 )
 
@@ -169,190 +72,183 @@ main_rqlite = rqlite.RqliteCluster(
 main_redis = redis.RedisCluster("main_redis", main_vpc)
 
 
-def make_standard_webapp_configuration(args) -> str:
-    rqlite_ips: List[str] = args[: len(main_rqlite.instances)]
-    redis_ips: List[str] = args[
-        len(rqlite_ips) : len(rqlite_ips) + len(main_redis.instances)
+_STANDARD_WEBAPP_CONFIGURATION_TEMPLATE = "\n".join(
+    [
+        "export RQLITE_IPS={joined_rqlite_ips}",
+        "export REDIS_IPS={joined_redis_ips}",
+        "export DEPLOYMENT_SECRET={deploy_secret}",
+        "export SLACK_WEB_ERRORS_URL={web_errors_url}",
+        "export SLACK_OPS_URL={ops_url}",
+        "export ROOT_FRONTEND_URL={root_url}",
+        "export ROOT_BACKEND_URL={root_url}",
+        "export ROOT_FRONTEND_SSR_URL={root_url}",
+        "export ROOT_WEBSOCKET_URL={root_websocket_url}",
+        "export ROOT_EMAIL_TEMPLATE_URL={root_url}",
+        "export OSEH_S3_BUCKET_NAME={s3_bucket_name}",
+        "export OSEH_IMAGE_FILE_JWT_SECRET={image_file_jwt_secret}",
+        "export OSEH_FILE_UPLOAD_JWT_SECRET={file_upload_jwt_secret}",
+        "export OSEH_CONTENT_FILE_JWT_SECRET={content_file_jwt_secret}",
+        "export OSEH_JOURNEY_JWT_SECRET={journey_jwt_secret}",
+        "export OSEH_DAILY_EVENT_JWT_SECRET={daily_event_jwt_secret}",
+        "export OSEH_INTERACTIVE_PROMPT_JWT_SECRET={interactive_prompt_jwt_secret}",
+        "export OSEH_SIWO_JWT_SECRET={oseh_siwo_jwt_secret}",
+        "export OSEH_REVENUE_CAT_SECRET_KEY={revenue_cat_secret_key}",
+        "export OSEH_REVENUE_CAT_V2_SECRET_KEY={revenue_cat_v2_secret_key}",
+        "export OSEH_REVENUE_CAT_STRIPE_PUBLIC_KEY={revenue_cat_stripe_public_key}",
+        "export OSEH_REVENUE_CAT_GOOGLE_PLAY_PUBLIC_KEY={revenue_cat_google_play_public_key}",
+        "export OSEH_REVENUE_CAT_APPLE_PUBLIC_KEY={revenue_cat_apple_public_key}",
+        "export OSEH_STRIPE_SECRET_KEY={stripe_secret_key}",
+        "export OSEH_STRIPE_PUBLIC_KEY={stripe_public_key}",
+        "export OSEH_STRIPE_PRICE_ID={stripe_price_id}",
+        "export OSEH_GOOGLE_CLIENT_ID={google_client_id}",
+        "export OSEH_GOOGLE_CLIENT_SECRET={google_client_secret}",
+        "export OSEH_APPLE_CLIENT_ID={apple_client_id}",
+        "export OSEH_APPLE_KEY_ID={apple_key_id}",
+        "export OSEH_APPLE_KEY_BASE64={apple_key_base64}",
+        "export OSEH_APPLE_APP_ID_TEAM_ID={apple_app_id_team_id}",
+        "export OSEH_ID_TOKEN_SECRET={id_token_secret}",
+        "export OSEH_REFRESH_TOKEN_SECRET={refresh_token_secret}",
+        "export OSEH_TWILIO_ACCOUNT_SID={twilio_account_sid}",
+        "export OSEH_TWILIO_AUTH_TOKEN={twilio_auth_token}",
+        "export OSEH_TWILIO_PHONE_NUMBER={twilio_phone_number}",
+        "export OSEH_TWILIO_VERIFY_SERVICE_SID={twilio_verify_service_sid}",
+        "export OSEH_TWILIO_MESSAGE_SERVICE_SID={twilio_message_service_sid}",
+        "export OSEH_KLAVIYO_API_KEY={klaviyo_api_key}",
+        "export SLACK_OSEH_BOT_URL={slack_oseh_bot_url}",
+        "export SLACK_OSEH_CLASSES_URL={slack_oseh_classes_url}",
+        "export OSEH_COURSE_JWT_SECRET={course_jwt_secret}",
+        "export OSEH_OPENAI_API_KEY={oseh_openai_api_key}",
+        "export OSEH_PEXELS_API_KEY={oseh_pexels_api_key}",
+        "export OSEH_STABILITY_AI_KEY={oseh_stability_ai_key}",
+        "export OSEH_PLAY_HT_USER_ID={oseh_play_ht_user_id}",
+        "export OSEH_PLAY_HT_SECRET_KEY={oseh_play_ht_api_key}",
+        "export OSEH_REDDIT_CLIENT_ID={oseh_reddit_client_id}",
+        "export OSEH_REDDIT_CLIENT_SECRET={oseh_reddit_client_secret}",
+        "export OSEH_MASTODON_CLIENT_ID={oseh_mastodon_client_id}",
+        "export OSEH_MASTODON_CLIENT_SECRET={oseh_mastodon_client_secret}",
+        "export OSEH_MASTODON_ACCESS_TOKEN={oseh_mastodon_access_token}",
+        "export OSEH_DIRECT_ACCOUNT_CLIENT_ID={oseh_direct_account_client_id}",
+        "export OSEH_DIRECT_ACCOUNT_CLIENT_SECRET={oseh_direct_account_client_secret}",
+        "export OSEH_DIRECT_ACCOUNT_REDIRECT_PATH={oseh_direct_account_redirect_path}",
+        "export OSEH_DIRECT_ACCOUNT_JWT_SECRET={oseh_direct_account_jwt_secret}",
+        "export OSEH_CSRF_JWT_SECRET_WEB={oseh_csrf_jwt_secret_web}",
+        "export OSEH_CSRF_JWT_SECRET_NATIVE={oseh_csrf_jwt_secret_native}",
+        "export OSEH_EXPO_NOTIFICATION_ACCESS_TOKEN={oseh_expo_notification_access_token}",
+        "export OSEH_EMAIL_TEMPLATE_JWT_SECRET={oseh_email_template_jwt_secret}",
+        "export OSEH_BUILD_SUBNET_ID={oseh_build_subnet_id}",
+        "export OSEH_BACKUP_BUILD_SUBNET_ID={oseh_backup_build_subnet_id}",
+        "export OSEH_BUILD_AMI_ID={oseh_build_ami_id}",
+        "export OSEH_BUILD_SECURITY_GROUP_ID={oseh_build_security_group_id}",
+        "export OSEH_BUILD_IAM_INSTANCE_PROFILE_NAME={oseh_build_iam_instance_profile_name}",
+        "export OSEH_MERGE_JWT_SECRET={oseh_merge_jwt_secret}",
+        "export OSEH_TRANSCRIPT_JWT_SECRET={oseh_transcript_jwt_secret}",
+        "export OSEH_PROGRESS_JWT_SECRET={oseh_progress_jwt_secret}",
+        "export OSEH_GENDER_API_KEY={oseh_gender_api_key}",
+        "export OSEH_CLIENT_SCREEN_JWT_SECRET={oseh_client_screen_jwt_secret}",
+        "export OSEH_JOURNAL_JWT_SECRET={oseh_journal_jwt_secret}",
+        "export OSEH_VOICE_NOTE_JWT_SECRET={oseh_voice_note_jwt_secret}",
+        "export ENVIRONMENT=production",
+        "export AWS_DEFAULT_REGION=us-west-2",
     ]
-    remaining = args[len(rqlite_ips) + len(redis_ips) :]
-    deploy_secret: str = remaining[0]
-    web_errors_url: str = remaining[1]
-    ops_url: str = remaining[2]
-    domain: str = remaining[3]
-    s3_bucket_name: str = remaining[4]
-    image_file_jwt_secret: str = remaining[5]
-    file_upload_jwt_secret: str = remaining[6]
-    content_file_jwt_secret: str = remaining[7]
-    journey_jwt_secret: str = remaining[8]
-    daily_event_jwt_secret: str = remaining[9]
-    revenue_cat_secret_key: str = remaining[10]
-    revenue_cat_stripe_public_key: str = remaining[11]
-    stripe_secret_key: str = remaining[12]
-    stripe_public_key: str = remaining[13]
-    stripe_price_id: str = remaining[14]
-    google_client_id: str = remaining[15]
-    google_client_secret: str = remaining[16]
-    apple_client_id: str = remaining[17]
-    apple_key_id: str = remaining[18]
-    apple_key: str = remaining[19]
-    apple_app_id_team_id: str = remaining[20]
-    id_token_secret: str = remaining[21]
-    refresh_token_secret: str = remaining[22]
-    twilio_account_sid: str = remaining[23]
-    twilio_auth_token: str = remaining[24]
-    twilio_phone_number: str = remaining[25]
-    twilio_verify_service_sid: str = remaining[26]
-    twilio_message_service_sid: str = remaining[27]
-    slack_oseh_bot_url: str = remaining[28]
-    interactive_prompt_jwt_secret: str = remaining[29]
-    klaviyo_api_key: str = remaining[30]
-    slack_oseh_classes_url: str = remaining[31]
-    course_jwt_secret: str = remaining[32]
-    oseh_openai_api_key: str = remaining[33]
-    oseh_pexels_api_key: str = remaining[34]
-    oseh_stability_ai_key: str = remaining[35]
-    oseh_play_ht_user_id: str = remaining[36]
-    oseh_play_ht_api_key: str = remaining[37]
-    oseh_reddit_client_id: str = remaining[38]
-    oseh_reddit_client_secret: str = remaining[39]
-    oseh_mastodon_client_id: str = remaining[40]
-    oseh_mastodon_client_secret: str = remaining[41]
-    oseh_mastodon_access_token: str = remaining[42]
-    oseh_direct_account_client_id: str = remaining[43]
-    oseh_direct_account_client_secret: str = remaining[44]
-    oseh_direct_account_redirect_path: str = remaining[45]
-    oseh_direct_account_jwt_secret: str = remaining[46]
-    oseh_csrf_jwt_secret_web: str = remaining[47]
-    oseh_csrf_jwt_secret_native: str = remaining[48]
-    oseh_expo_notification_access_token: str = remaining[49]
-    oseh_email_template_jwt_secret: str = remaining[50]
-    oseh_siwo_jwt_secret: str = remaining[51]
-    oseh_build_subnet_id: str = remaining[52]
-    oseh_build_ami_id: str = remaining[53]
-    oseh_build_security_group_id: str = remaining[54]
-    oseh_build_iam_instance_profile_name: str = remaining[55]
-    oseh_merge_jwt_secret: str = remaining[56]
-    oseh_transcript_jwt_secret: str = remaining[57]
-    oseh_progress_jwt_secret: str = remaining[58]
-    revenue_cat_v2_secret_key: str = remaining[59]
-    revenue_cat_google_play_public_key: str = remaining[60]
-    revenue_cat_apple_public_key: str = remaining[61]
-    oseh_gender_api_key: str = remaining[62]
-    oseh_client_screen_jwt_secret: str = remaining[63]
-    oseh_backup_build_subnet_id: str = remaining[64]
-    oseh_journal_jwt_secret: str = remaining[65]
-    oseh_voice_note_jwt_secret: str = remaining[66]
+)
+"""The environment.sh shared by every webapp, as a template for str.format_map
+where the keys are the names in standard_configuration_outputs or the values
+named in make_standard_webapp_configuration. Values are substituted
+already quoted for the shell (see quote_shell_value)
+"""
 
-    joined_rqlite_ips = ",".join(rqlite_ips)
-    joined_redis_ips = ",".join(redis_ips)
+_SAFE_SHELL_VALUE_RE = re.compile(r"[A-Za-z0-9_/+=.:,-]*")
+"""Matches values that can be placed in double quotes without escaping"""
 
-    domain_no_trailing_dot = domain.rstrip(".")
 
-    apple_key_base64 = base64.b64encode(apple_key.encode("utf-8")).decode("utf-8")
+def quote_shell_value(value: str) -> str:
+    """Quotes the given value for use as a single shell word. Values which
+    only contain characters that are never special within double quotes,
+    which is nearly all of them, are simply double quoted; anything else is
+    quoted via shlex.quote so it is taken literally.
+    """
+    if _SAFE_SHELL_VALUE_RE.fullmatch(value):
+        return f'"{value}"'
+    return shlex.quote(value)
 
-    return "\n".join(
-        [
-            f'export RQLITE_IPS="{joined_rqlite_ips}"',
-            f'export REDIS_IPS="{joined_redis_ips}"',
-            f'export DEPLOYMENT_SECRET="{deploy_secret}"',
-            f'export SLACK_WEB_ERRORS_URL="{web_errors_url}"',
-            f'export SLACK_OPS_URL="{ops_url}"',
-            f'export ROOT_FRONTEND_URL="https://{domain_no_trailing_dot}"',
-            f'export ROOT_BACKEND_URL="https://{domain_no_trailing_dot}"',
-            f'export ROOT_FRONTEND_SSR_URL="https://{domain_no_trailing_dot}"',
-            f'export ROOT_WEBSOCKET_URL="wss://{domain_no_trailing_dot}"',
-            f'export ROOT_EMAIL_TEMPLATE_URL="https://{domain_no_trailing_dot}"',
-            f'export OSEH_S3_BUCKET_NAME="{s3_bucket_name}"',
-            f'export OSEH_IMAGE_FILE_JWT_SECRET="{image_file_jwt_secret}"',
-            f'export OSEH_FILE_UPLOAD_JWT_SECRET="{file_upload_jwt_secret}"',
-            f'export OSEH_CONTENT_FILE_JWT_SECRET="{content_file_jwt_secret}"',
-            f'export OSEH_JOURNEY_JWT_SECRET="{journey_jwt_secret}"',
-            f'export OSEH_DAILY_EVENT_JWT_SECRET="{daily_event_jwt_secret}"',
-            f'export OSEH_INTERACTIVE_PROMPT_JWT_SECRET="{interactive_prompt_jwt_secret}"',
-            f'export OSEH_SIWO_JWT_SECRET="{oseh_siwo_jwt_secret}"',
-            f'export OSEH_REVENUE_CAT_SECRET_KEY="{revenue_cat_secret_key}"',
-            f'export OSEH_REVENUE_CAT_V2_SECRET_KEY="{revenue_cat_v2_secret_key}"',
-            f'export OSEH_REVENUE_CAT_STRIPE_PUBLIC_KEY="{revenue_cat_stripe_public_key}"',
-            f'export OSEH_REVENUE_CAT_GOOGLE_PLAY_PUBLIC_KEY="{revenue_cat_google_play_public_key}"',
-            f'export OSEH_REVENUE_CAT_APPLE_PUBLIC_KEY="{revenue_cat_apple_public_key}"',
-            f'export OSEH_STRIPE_SECRET_KEY="{stripe_secret_key}"',
-            f'export OSEH_STRIPE_PUBLIC_KEY="{stripe_public_key}"',
-            f'export OSEH_STRIPE_PRICE_ID="{stripe_price_id}"',
-            f'export OSEH_GOOGLE_CLIENT_ID="{google_client_id}"',
-            f'export OSEH_GOOGLE_CLIENT_SECRET="{google_client_secret}"',
-            f'export OSEH_APPLE_CLIENT_ID="{apple_client_id}"',
-            f'export OSEH_APPLE_KEY_ID="{apple_key_id}"',
-            f'export OSEH_APPLE_KEY_BASE64="{apple_key_base64}"',
-            f'export OSEH_APPLE_APP_ID_TEAM_ID="{apple_app_id_team_id}"',
-            f'export OSEH_ID_TOKEN_SECRET="{id_token_secret}"',
-            f'export OSEH_REFRESH_TOKEN_SECRET="{refresh_token_secret}"',
-            f'export OSEH_TWILIO_ACCOUNT_SID="{twilio_account_sid}"',
-            f'export OSEH_TWILIO_AUTH_TOKEN="{twilio_auth_token}"',
-            f'export OSEH_TWILIO_PHONE_NUMBER="{twilio_phone_number}"',
-            f'export OSEH_TWILIO_VERIFY_SERVICE_SID="{twilio_verify_service_sid}"',
-            f'export OSEH_TWILIO_MESSAGE_SERVICE_SID="{twilio_message_service_sid}"',
-            f'export OSEH_KLAVIYO_API_KEY="{klaviyo_api_key}"',
-            f'export SLACK_OSEH_BOT_URL="{slack_oseh_bot_url}"',
-            f'export SLACK_OSEH_CLASSES_URL="{slack_oseh_classes_url}"',
-            f'export OSEH_COURSE_JWT_SECRET="{course_jwt_secret}"',
-            f'export OSEH_OPENAI_API_KEY="{oseh_openai_api_key}"',
-            f'export OSEH_PEXELS_API_KEY="{oseh_pexels_api_key}"',
-            f'export OSEH_STABILITY_AI_KEY="{oseh_stability_ai_key}"',
-            f'export OSEH_PLAY_HT_USER_ID="{oseh_play_ht_user_id}"',
-            f'export OSEH_PLAY_HT_SECRET_KEY="{oseh_play_ht_api_key}"',
-            f'export OSEH_REDDIT_CLIENT_ID="{oseh_reddit_client_id}"',
-            f'export OSEH_REDDIT_CLIENT_SECRET="{oseh_reddit_client_secret}"',
-            f'export OSEH_MASTODON_CLIENT_ID="{oseh_mastodon_client_id}"',
-            f'export OSEH_MASTODON_CLIENT_SECRET="{oseh_mastodon_client_secret}"',
-            f'export OSEH_MASTODON_ACCESS_TOKEN="{oseh_mastodon_access_token}"',
-            f'export OSEH_DIRECT_ACCOUNT_CLIENT_ID="{oseh_direct_account_client_id}"',
-            f'export OSEH_DIRECT_ACCOUNT_CLIENT_SECRET="{oseh_direct_account_client_secret}"',
-            f'export OSEH_DIRECT_ACCOUNT_REDIRECT_PATH="{oseh_direct_account_redirect_path}"',
-            f'export OSEH_DIRECT_ACCOUNT_JWT_SECRET="{oseh_direct_account_jwt_secret}"',
-            f'export OSEH_CSRF_JWT_SECRET_WEB="{oseh_csrf_jwt_secret_web}"',
-            f'export OSEH_CSRF_JWT_SECRET_NATIVE="{oseh_csrf_jwt_secret_native}"',
-            f'export OSEH_EXPO_NOTIFICATION_ACCESS_TOKEN="{oseh_expo_notification_access_token}"',
-            f'export OSEH_EMAIL_TEMPLATE_JWT_SECRET="{oseh_email_template_jwt_secret}"',
-            f'export OSEH_BUILD_SUBNET_ID="{oseh_build_subnet_id}"',
-            f'export OSEH_BACKUP_BUILD_SUBNET_ID="{oseh_backup_build_subnet_id}"',
-            f'export OSEH_BUILD_AMI_ID="{oseh_build_ami_id}"',
-            f'export OSEH_BUILD_SECURITY_GROUP_ID="{oseh_build_security_group_id}"',
-            f'export OSEH_BUILD_IAM_INSTANCE_PROFILE_NAME="{oseh_build_iam_instance_profile_name}"',
-            f'export OSEH_MERGE_JWT_SECRET="{oseh_merge_jwt_secret}"',
-            f'export OSEH_TRANSCRIPT_JWT_SECRET="{oseh_transcript_jwt_secret}"',
-            f'export OSEH_PROGRESS_JWT_SECRET="{oseh_progress_jwt_secret}"',
-            f'export OSEH_GENDER_API_KEY="{oseh_gender_api_key}"',
-            f'export OSEH_CLIENT_SCREEN_JWT_SECRET="{oseh_client_screen_jwt_secret}"',
-            f'export OSEH_JOURNAL_JWT_SECRET="{oseh_journal_jwt_secret}"',
-            f'export OSEH_VOICE_NOTE_JWT_SECRET="{oseh_voice_note_jwt_secret}"',
-            f"export ENVIRONMENT=production",
-            f"export AWS_DEFAULT_REGION=us-west-2",
-        ]
-    )
 
+def read_file_base64(path: str) -> str:
+    """Reads the text file at the given path and returns its contents base64
+    encoded.
+    """
+    with open(path, "r") as f:
+        contents = f.read()
 
-def make_low_resource_jobs_configuration(args) -> str:
-    standard_configuration = args[0]
-    return "\n".join([standard_configuration, "export OSEH_JOB_CATEGORIES=2"])
+    try:
+        # PEM keys are always ascii, which skips the utf-8 multibyte scan
+        raw = contents.encode("ascii")
+    except UnicodeEncodeError:
+        raw = contents.encode("utf-8")
 
+    return base64.b64encode(raw).decode("ascii")
 
-def make_high_resource_jobs_configuration(args) -> str:
-    standard_configuration = args[0]
-    return "\n".join([standard_configuration, "export OSEH_JOB_CATEGORIES=1,2"])
+
+def make_standard_webapp_configuration(
+    values: Dict[str, str],
+    *,
+    domain_no_trailing_dot: str,
+    stripe_price_id: str,
+    google_client_id: str,
+    apple_client_id: str,
+    apple_key_id: str,
+    apple_key_base64: str,
+    apple_app_id_team_id: str,
+    twilio_account_sid: str,
+    twilio_phone_number: str,
+    twilio_verify_service_sid: str,
+    twilio_message_service_sid: str,
+    oseh_play_ht_user_id: str,
+    oseh_direct_account_redirect_path: str,
+) -> str:
+    """Renders the environment.sh shared by every webapp. values are the
+    resolved standard_configuration_outputs; values known while constructing
+    the program are bound by keyword instead so they don't need to pass
+    through pulumi.Output.all
+    """
+    substitutions: Dict[str, str] = {
+        **values,
+        "root_url": f"https://{domain_no_trailing_dot}",
+        "root_websocket_url": f"wss://{domain_no_trailing_dot}",
+        "stripe_price_id": stripe_price_id,
+        "google_client_id": google_client_id,
+        "apple_client_id": apple_client_id,
+        "apple_key_id": apple_key_id,
+        "apple_key_base64": apple_key_base64,
+        "apple_app_id_team_id": apple_app_id_team_id,
+        "twilio_account_sid": twilio_account_sid,
+        "twilio_phone_number": twilio_phone_number,
+        "twilio_verify_service_sid": twilio_verify_service_sid,
+        "twilio_message_service_sid": twilio_message_service_sid,
+        "oseh_play_ht_user_id": oseh_play_ht_user_id,
+        "oseh_direct_account_redirect_path": oseh_direct_account_redirect_path,
+    }
+    return _STANDARD_WEBAPP_CONFIGURATION_TEMPLATE.format_map(
+        {key: quote_shell_value(value) for key, value in substitutions.items()}
+    )
 
 
 bucket = aws.s3.Bucket(
     "bucket", acl="private", tags={"Name": "oseh"}, force_destroy=True
 )
+common_webapp_args = dict(
+    vpc=main_vpc,
+    github_username=cfg.github_username,
+    github_pat=cfg.github_pat,
+    bastion=main_vpc.bastion.public_ip,
+    key=key,
+)
+"""The arguments which are the same for every webapp"""
+
 backend_rest = webapp.Webapp(
     "backend_rest",
-    main_vpc,
-    "meetoseh/backend",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
-    webapp_counter=webapp_counter + 1,
+    github_repository="meetoseh/backend",
+    **common_webapp_args,
+    webapp_counter=cfg.webapp_counter + 1,
     num_subnets=2,
     bleeding_ami=True,  # python version 3.9+
     instance_type="t4g.small",  # i think it's running out of memory on the nano occassionally
@@ -360,48 +256,32 @@ backend_rest = webapp.Webapp(
 )
 backend_ws = webapp.Webapp(
     "backend_ws",
-    main_vpc,
-    "meetoseh/websocket",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
-    webapp_counter=webapp_counter,
+    github_repository="meetoseh/websocket",
+    **common_webapp_args,
+    webapp_counter=cfg.webapp_counter,
     bleeding_ami=True,  # python version 3.9+
 )
 frontend = webapp.Webapp(
     "frontend",
-    main_vpc,
-    "meetoseh/frontend-web",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
+    github_repository="meetoseh/frontend-web",
+    **common_webapp_args,
     instance_type="t4g.nano",
     bleeding_ami=True,
-    webapp_counter=webapp_counter,
+    webapp_counter=cfg.webapp_counter,
 )
 frontend_ssr = webapp.Webapp(
     "frontend-ssr",
-    main_vpc,
-    "meetoseh/frontend-ssr-web",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
+    github_repository="meetoseh/frontend-ssr-web",
+    **common_webapp_args,
     instance_type="t4g.small",
     bleeding_ami=True,  # required for node 18
-    webapp_counter=webapp_counter,
+    webapp_counter=cfg.webapp_counter,
 )
 high_resource_jobs = webapp.Webapp(
     "high_resource_jobs",
-    main_vpc,
-    "meetoseh/jobs",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
-    webapp_counter=webapp_counter + 1,
+    github_repository="meetoseh/jobs",
+    **common_webapp_args,
+    webapp_counter=cfg.webapp_counter + 1,
     num_instances_per_subnet=1,
     instance_type="m6g.large",  # needs at least 3 GiB memory; c7g.2xlarge does a ~2m video in 47m
     bleeding_ami=True,  # required for pympanim
@@ -409,25 +289,17 @@ high_resource_jobs = webapp.Webapp(
 )
 low_resource_jobs = webapp.Webapp(
     "low_resource_jobs",
-    main_vpc,
-    "meetoseh/jobs",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
-    webapp_counter=webapp_counter,
+    github_repository="meetoseh/jobs",
+    **common_webapp_args,
+    webapp_counter=cfg.webapp_counter,
     instance_type="t4g.small",  # ffmpeg memory >1.3gb to install
     bleeding_ami=True,  # required for pympanim
 )
 backend_email_templates = webapp.Webapp(
     "email-templates",
-    main_vpc,
-    "meetoseh/email-templates",
-    github_username,
-    github_pat,
-    main_vpc.bastion.public_ip,
-    key,
-    webapp_counter=webapp_counter + 1,
+    github_repository="meetoseh/email-templates",
+    **common_webapp_args,
+    webapp_counter=cfg.webapp_counter + 1,
     instance_type="t4g.small",  # node requires 1.2gb ram to build :/
     bleeding_ami=True,  # required for node 18
 )
@@ -443,93 +315,110 @@ main_reverse_proxy = reverse_proxy.ReverseProxy(
 )
 tls = TransportLayerSecurity(
     "tls",
-    domain,
+    cfg.domain,
     main_vpc.vpc.id,
     [subnet.id for subnet in main_vpc.public_subnets],
     [instance.id for instance in main_reverse_proxy.reverse_proxies],
 )
 
-with open(apple_key_file, "r") as f:
-    apple_private_key = f.read()
+domain_no_trailing_dot = tls.domain_without_trailing_dot
+
+apple_key_base64 = read_file_base64(cfg.apple_key_file)
+"""The apple private key, base64 encoded. Encoded once here rather than on
+every render of the standard configuration
+"""
 
-standard_configuration = pulumi.Output.all(
-    *[instance.private_ip for instance in main_rqlite.instances],
-    *[instance.private_ip for instance in main_redis.instances],
-    deployment_secret,
-    slack_web_errors_url,
-    slack_ops_url,
-    domain,
-    bucket.bucket,
-    image_file_jwt_secret,
-    file_upload_jwt_secret,
-    content_file_jwt_secret,
-    journey_jwt_secret,
-    daily_event_jwt_secret,
-    revenue_cat_secret_key,
-    revenue_cat_stripe_public_key,
-    stripe_secret_key,
-    stripe_public_key,
-    stripe_price_id,
-    google_oidc_client_id,
-    google_oidc_client_secret,
-    apple_services_id,
-    apple_key_id,
-    apple_private_key,
-    apple_app_id_team_id,
-    id_token_secret,
-    refresh_token_secret,
-    twilio_account_sid,
-    twilio_auth_token,
-    twilio_phone_number,
-    twilio_verify_service_sid,
-    twilio_message_service_sid,
-    slack_oseh_bot_url,
-    interactive_prompt_jwt_secret,
-    klaviyo_api_key,
-    slack_oseh_classes_url,
-    course_jwt_secret,
-    oseh_openai_api_key,
-    oseh_pexels_api_key,
-    oseh_stability_ai_key,
-    oseh_play_ht_user_id,
-    oseh_play_ht_api_key,
-    oseh_reddit_client_id,
-    oseh_reddit_client_secret,
-    oseh_mastodon_client_id,
-    oseh_mastodon_client_secret,
-    oseh_mastodon_access_token,
-    oseh_direct_account_client_id,
-    oseh_direct_account_client_secret,
-    oseh_direct_account_redirect_path,
-    oseh_direct_account_jwt_secret,
-    oseh_csrf_jwt_secret_web,
-    oseh_csrf_jwt_secret_native,
-    oseh_expo_notification_access_token,
-    oseh_email_template_jwt_secret,
-    oseh_siwo_jwt_secret,
-    main_vpc.private_subnets[0].id,
-    main_vpc.amazon_linux_bleeding_arm64.id,
-    frontend.security_group.id,
-    main_vpc.standard_instance_profile.name,
-    oseh_merge_jwt_secret,
-    oseh_transcript_jwt_secret,
-    oseh_progress_jwt_secret,
-    revenue_cat_v2_secret_key,
-    revenue_cat_google_play_public_key,
-    revenue_cat_apple_public_key,
-    oseh_gender_api_key,
-    oseh_client_screen_jwt_secret,
-    main_vpc.private_subnets[1].id,
-    oseh_journal_jwt_secret,
-    oseh_voice_note_jwt_secret,
-).apply(make_standard_webapp_configuration)
-high_resource_config = pulumi.Output.all(standard_configuration).apply(
-    make_high_resource_jobs_configuration
+standard_configuration_outputs: Dict[str, pulumi.Output[str]] = {
+    "joined_rqlite_ips": main_rqlite.all_private_ips.apply(",".join),
+    "joined_redis_ips": main_redis.all_private_ips.apply(",".join),
+    "deploy_secret": cfg.deployment_secret,
+    "web_errors_url": cfg.slack_web_errors_url,
+    "ops_url": cfg.slack_ops_url,
+    "s3_bucket_name": bucket.bucket,
+    "image_file_jwt_secret": cfg.image_file_jwt_secret,
+    "file_upload_jwt_secret": cfg.file_upload_jwt_secret,
+    "content_file_jwt_secret": cfg.content_file_jwt_secret,
+    "journey_jwt_secret": cfg.journey_jwt_secret,
+    "daily_event_jwt_secret": cfg.daily_event_jwt_secret,
+    "revenue_cat_secret_key": cfg.revenue_cat_secret_key,
+    "revenue_cat_stripe_public_key": cfg.revenue_cat_stripe_public_key,
+    "stripe_secret_key": cfg.stripe_secret_key,
+    "stripe_public_key": cfg.stripe_public_key,
+    "google_client_secret": cfg.google_oidc_client_secret,
+    "id_token_secret": cfg.id_token_secret,
+    "refresh_token_secret": cfg.refresh_token_secret,
+    "twilio_auth_token": cfg.twilio_auth_token,
+    "slack_oseh_bot_url": cfg.slack_oseh_bot_url,
+    "interactive_prompt_jwt_secret": cfg.interactive_prompt_jwt_secret,
+    "klaviyo_api_key": cfg.klaviyo_api_key,
+    "slack_oseh_classes_url": cfg.slack_oseh_classes_url,
+    "course_jwt_secret": cfg.course_jwt_secret,
+    "oseh_openai_api_key": cfg.oseh_openai_api_key,
+    "oseh_pexels_api_key": cfg.oseh_pexels_api_key,
+    "oseh_stability_ai_key": cfg.oseh_stability_ai_key,
+    "oseh_play_ht_api_key": cfg.oseh_play_ht_api_key,
+    "oseh_reddit_client_id": cfg.oseh_reddit_client_id,
+    "oseh_reddit_client_secret": cfg.oseh_reddit_client_secret,
+    "oseh_mastodon_client_id": cfg.oseh_mastodon_client_id,
+    "oseh_mastodon_client_secret": cfg.oseh_mastodon_client_secret,
+    "oseh_mastodon_access_token": cfg.oseh_mastodon_access_token,
+    "oseh_direct_account_client_id": cfg.oseh_direct_account_client_id,
+    "oseh_direct_account_client_secret": cfg.oseh_direct_account_client_secret,
+    "oseh_direct_account_jwt_secret": cfg.oseh_direct_account_jwt_secret,
+    "oseh_csrf_jwt_secret_web": cfg.oseh_csrf_jwt_secret_web,
+    "oseh_csrf_jwt_secret_native": cfg.oseh_csrf_jwt_secret_native,
+    "oseh_expo_notification_access_token": cfg.oseh_expo_notification_access_token,
+    "oseh_email_template_jwt_secret": cfg.oseh_email_template_jwt_secret,
+    "oseh_siwo_jwt_secret": cfg.oseh_siwo_jwt_secret,
+    "oseh_build_subnet_id": main_vpc.private_subnets[0].id,
+    "oseh_build_ami_id": main_vpc.amazon_linux_bleeding_arm64.id,
+    "oseh_build_security_group_id": frontend.security_group.id,
+    "oseh_build_iam_instance_profile_name": main_vpc.standard_instance_profile.name,
+    "oseh_merge_jwt_secret": cfg.oseh_merge_jwt_secret,
+    "oseh_transcript_jwt_secret": cfg.oseh_transcript_jwt_secret,
+    "oseh_progress_jwt_secret": cfg.oseh_progress_jwt_secret,
+    "revenue_cat_v2_secret_key": cfg.revenue_cat_v2_secret_key,
+    "revenue_cat_google_play_public_key": cfg.revenue_cat_google_play_public_key,
+    "revenue_cat_apple_public_key": cfg.revenue_cat_apple_public_key,
+    "oseh_gender_api_key": cfg.oseh_gender_api_key,
+    "oseh_client_screen_jwt_secret": cfg.oseh_client_screen_jwt_secret,
+    "oseh_backup_build_subnet_id": main_vpc.private_subnets[1].id,
+    "oseh_journal_jwt_secret": cfg.oseh_journal_jwt_secret,
+    "oseh_voice_note_jwt_secret": cfg.oseh_voice_note_jwt_secret,
+}
+"""The outputs substituted into the standard webapp configuration, by their
+name in the template
+"""
+
+standard_configuration = pulumi.Output.all(**standard_configuration_outputs).apply(
+    lambda values: make_standard_webapp_configuration(
+        values,
+        domain_no_trailing_dot=domain_no_trailing_dot,
+        stripe_price_id=cfg.stripe_price_id,
+        google_client_id=cfg.google_oidc_client_id,
+        apple_client_id=cfg.apple_services_id,
+        apple_key_id=cfg.apple_key_id,
+        apple_key_base64=apple_key_base64,
+        apple_app_id_team_id=cfg.apple_app_id_team_id,
+        twilio_account_sid=cfg.twilio_account_sid,
+        twilio_phone_number=cfg.twilio_phone_number,
+        twilio_verify_service_sid=cfg.twilio_verify_service_sid,
+        twilio_message_service_sid=cfg.twilio_message_service_sid,
+        oseh_play_ht_user_id=cfg.oseh_play_ht_user_id,
+        oseh_direct_account_redirect_path=cfg.oseh_direct_account_redirect_path,
+    )
 )
-low_resource_config = pulumi.Output.all(standard_configuration).apply(
-    make_low_resource_jobs_configuration
+high_resource_config = standard_configuration.apply(
+    lambda s: s + "\nexport OSEH_JOB_CATEGORIES=1,2"
+)
+low_resource_config = standard_configuration.apply(
+    lambda s: s + "\nexport OSEH_JOB_CATEGORIES=2"
 )
 
+# perform_remote_executions only registers the RemoteExecution resources; it
+# never blocks on ssh. Each execution depends only on its own instance, the
+# configuration, and the private route table associations, so the engine runs
+# all of them concurrently. Don't add depends_on between webapps here.
 backend_rest.perform_remote_executions(standard_configuration)
 backend_ws.perform_remote_executions(standard_configuration)
 backend_email_templates.perform_remote_executions(standard_configuration)
@@ -543,12 +432,15 @@ mail = SimpleEmailService(
     tls,
     "/api/1/emails/sns-mail",
     [
-        *(itm for row in backend_rest.remote_executions_by_subnet for itm in row),
-        *(itm for itm in main_reverse_proxy.reverse_proxy_installs),
+        *itertools.chain.from_iterable(backend_rest.remote_executions_by_subnet),
+        *main_reverse_proxy.reverse_proxy_installs,
         tls.lb_tls_listener,
     ],
 )
 
+for output_name, output in main_vpc.exports().items():
+    pulumi.export(output_name, output)
+
 pulumi.export(
     "example reverse proxy ip", main_reverse_proxy.reverse_proxies[0].private_ip
 )
@@ -571,10 +463,7 @@ pulumi.export(
     high_resource_jobs.instances_by_subnet[0][0].private_ip,
 )
 pulumi.export("example rqlite ip", main_rqlite.instances[0].private_ip)
-pulumi.export(
-    "all rqlite ips",
-    pulumi.Output.all(instance.private_ip for instance in main_rqlite.instances),
-)
+pulumi.export("all rqlite ips", main_rqlite.all_private_ips)
 pulumi.export("redis ip 0", main_redis.instances[0].private_ip)
 pulumi.export("redis ip 1", main_redis.instances[1].private_ip)
 pulumi.export("redis ip 2", main_redis.instances[2].private_ip)
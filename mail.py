@@ -1,6 +1,5 @@
 """This module facilitates SES via an auto-subscribing SNS route"""
 
-import secrets
 from typing import List, Optional, TypedDict
 import pulumi
 import pulumi_aws as aws
@@ -50,18 +49,24 @@ class SimpleEmailService:
         """The list of dependencies to wait for before autoconfirming the
         subscription"""
 
-        trimmed_domain = self.tls.domain.rstrip(".")
+        trimmed_domain = self.tls.domain_without_trailing_dot
 
         self.domain_identity = aws.ses.DomainIdentity(
             f"{resource_name}-domain-identity",
             domain=trimmed_domain,
-            opts=pulumi.ResourceOptions(depends_on=[self.tls.certificate_validation]),
+            opts=pulumi.ResourceOptions(
+                depends_on=(
+                    [self.tls.certificate_validation]
+                    if self.tls.certificate_validation is not None
+                    else []
+                )
+            ),
         )
         """The domain identity that we will send emails from"""
 
         self.verification_record = aws.route53.Record(
             f"{resource_name}-verification-record",
-            zone_id=tls.route53_zone.zone_id,
+            zone_id=tls.route53_zone_id,
             name=f"_amazonses.{trimmed_domain}",
             type="TXT",
             ttl=600,
@@ -85,22 +90,23 @@ class SimpleEmailService:
 
         self.dkim_records = []
 
+        dkim_names_and_values = self.dkim.dkim_tokens.apply(
+            lambda tokens: [
+                (f"{token}._domainkey", f"{token}.dkim.amazonses.com")
+                for token in tokens
+            ]
+        )
+
         def _create_dkim_record(idx: int):
             # need to bind to a new variable idx rather than the loop
             # variable, otherwise all records will be the same
             return aws.route53.Record(
                 f"{resource_name}-dkim-record-{idx}-b",
-                zone_id=tls.route53_zone.zone_id,
-                name=self.dkim.dkim_tokens.apply(
-                    lambda tokens: f"{tokens[idx]}._domainkey"
-                ),
+                zone_id=tls.route53_zone_id,
+                name=dkim_names_and_values.apply(lambda pairs: pairs[idx][0]),
                 type="CNAME",
                 ttl=600,
-                records=[
-                    self.dkim.dkim_tokens.apply(
-                        lambda tokens: f"{tokens[idx]}.dkim.amazonses.com"
-                    )
-                ],
+                records=[dkim_names_and_values.apply(lambda pairs: pairs[idx][1])],
             )
 
         self.dkim_records = [_create_dkim_record(i) for i in range(3)]
@@ -134,28 +140,21 @@ class SimpleEmailService:
         )
         """The SNS topic subscription that will send email delivery notifications to the backend"""
 
-        self.bounce_subscription = aws.ses.IdentityNotificationTopic(
-            f"{resource_name}-bounce-subscription",
-            topic_arn=self.mail_feedback.arn,
-            notification_type="Bounce",
-            identity=self.domain_identity.domain,
-        )
+        def _create_notification_subscription(notification_type: str):
+            return aws.ses.IdentityNotificationTopic(
+                f"{resource_name}-{notification_type.lower()}-subscription",
+                topic_arn=self.mail_feedback.arn,
+                notification_type=notification_type,
+                identity=self.domain_identity.domain,
+            )
+
+        self.bounce_subscription = _create_notification_subscription("Bounce")
         """Indicates to SES that we want to receive bounce notifications via SNS"""
 
-        self.complaint_subscription = aws.ses.IdentityNotificationTopic(
-            f"{resource_name}-complaint-subscription",
-            topic_arn=self.mail_feedback.arn,
-            notification_type="Complaint",
-            identity=self.domain_identity.domain,
-        )
+        self.complaint_subscription = _create_notification_subscription("Complaint")
         """Indicates to SES that we want to receive complaint notifications via SNS"""
 
-        self.delivery_subscription = aws.ses.IdentityNotificationTopic(
-            f"{resource_name}-delivery-subscription",
-            topic_arn=self.mail_feedback.arn,
-            notification_type="Delivery",
-            identity=self.domain_identity.domain,
-        )
+        self.delivery_subscription = _create_notification_subscription("Delivery")
         """Indicates to SES that we want to receive delivery notifications via SNS"""
 
         self.email_forwarding_disabled = DisableEmailFeedbackForwardingResource(
@@ -182,8 +181,9 @@ class _DAFFInputs(TypedDict):
 
 class DisableEmailFeedbackForwarding(ResourceProvider):
     def create(self, inputs: _DAFFInputs):
-        new_id = secrets.token_urlsafe(16)
-        subprocess.call(
+        # the arguments must not go through a shell: with shell=True only
+        # "aws" itself would be run, and the rest would be handed to sh
+        subprocess.run(
             [
                 "aws",
                 "ses",
@@ -194,9 +194,20 @@ class DisableEmailFeedbackForwarding(ResourceProvider):
                 "--region",
                 "us-west-2",
             ],
-            shell=True,
+            check=True,
         )
-        return CreateResult(id_=new_id, outs={})
+        return CreateResult(
+            id_=f"daff-{inputs['domain']}", outs={"domain": inputs["domain"]}
+        )
+
+    def diff(
+        self, id: str, olds: _DAFFInputs, news: _DAFFInputs
+    ) -> pulumi.dynamic.DiffResult:
+        # forwarding only needs to be disabled again if the domain changes
+        if olds.get("domain") == news["domain"]:
+            return pulumi.dynamic.DiffResult(changes=False)
+
+        return pulumi.dynamic.DiffResult(changes=True, replaces=["domain"])
 
 
 class DisableEmailFeedbackForwardingResource(Resource):
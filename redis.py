@@ -1,5 +1,5 @@
 """This module allows creating a redis cluster (using redis sentinel)"""
-from typing import List, Optional
+from typing import Dict, List, Optional
 from remote_executor import RemoteExecution, RemoteExecutionInputs
 from vpc import VirtualPrivateCloud
 import pulumi_aws as aws
@@ -73,9 +73,7 @@ class RedisCluster:
                     from_port=22,
                     to_port=22,
                     protocol="tcp",
-                    cidr_blocks=[
-                        self.vpc.bastion.private_ip.apply(lambda ip: f"{ip}/32")
-                    ],
+                    cidr_blocks=[self.vpc.bastion_cidr],
                 ),
             ],
             egress=[
@@ -122,48 +120,57 @@ class RedisCluster:
         ]
         """the instances within this cluster"""
 
+        self.all_private_ips: pulumi.Output[List[str]] = pulumi.Output.all(
+            *[instance.private_ip for instance in self.instances]
+        )
+        """the private ips of the instances, in the same order as instances"""
+
+        common_remote_execution_args = dict(
+            private_key=self.vpc.key.private_key_path,
+            bastion=self.vpc.bastion.public_ip,
+            shared_script_name="setup-scripts/shared",
+        )
+
         self.remote_executions: List[RemoteExecution] = []
         """the remote executions required to bootstrap and maintain the cluster"""
 
-        for idx_outer, instance in enumerate(self.instances):
+        quorum = (len(self.instances) // 2) + 1
 
-            def generate_file_substitutions(args):
-                main_ip = args[-1]
-                idx: int = args[-2]
-                instance_ips: List[str] = args[:-2]
-                my_ip = instance_ips[idx]
-                quorum = (len(self.instances) // 2) + 1
-
-                return {
-                    "config.sh": {
-                        "MY_IP": my_ip,
-                        "MAIN_IP": main_ip,
-                        "QUORUM": str(quorum),
-                    },
-                    "redis.conf": {"MY_IP": my_ip},
-                    "sentinel.conf": {
-                        "MY_IP": my_ip,
-                        "MAIN_IP": main_ip,
-                        "QUORUM": str(quorum),
-                    },
-                }
+        main_ip_input: pulumi.Input[str] = (
+            main_ip if main_ip is not None else self.instances[0].private_ip
+        )
 
+        def generate_file_substitutions(
+            ips: Dict[str, str]
+        ) -> Dict[str, Dict[str, str]]:
+            my_ip = ips["my_ip"]
+            main_ip = ips["main_ip"]
+
+            return {
+                "config.sh": {
+                    "MY_IP": my_ip,
+                    "MAIN_IP": main_ip,
+                    "QUORUM": str(quorum),
+                },
+                "redis.conf": {"MY_IP": my_ip},
+                "sentinel.conf": {
+                    "MY_IP": my_ip,
+                    "MAIN_IP": main_ip,
+                    "QUORUM": str(quorum),
+                },
+            }
+
+        for idx_outer, instance in enumerate(self.instances):
             self.remote_executions.append(
                 RemoteExecution(
                     f"{resource_name}-remote-execution-{idx_outer}",
                     props=RemoteExecutionInputs(
                         script_name="setup-scripts/redis",
                         file_substitutions=pulumi.Output.all(
-                            *[i.private_ip for i in self.instances],
-                            idx_outer,
-                            main_ip
-                            if main_ip is not None
-                            else self.instances[0].private_ip,
+                            my_ip=instance.private_ip, main_ip=main_ip_input
                         ).apply(generate_file_substitutions),
                         host=instance.private_ip,
-                        private_key=self.vpc.key.private_key_path,
-                        bastion=self.vpc.bastion.public_ip,
-                        shared_script_name="setup-scripts/shared",
+                        **common_remote_execution_args,
                     ),
                     opts=pulumi.ResourceOptions(
                         ignore_changes=[
@@ -3,15 +3,20 @@ upload and execute scripts on remote machines managed by pulumi.
 In particular, this supports the ability to proxy requests through
 a bastion server - a common pattern when using VPCs.
 """
+import atexit
 import traceback
 import pulumi
 import paramiko
-from typing import Optional, TypedDict, Tuple, Dict
+from typing import List, Optional, TypedDict, Tuple, Dict
 import io
 import os
 import secrets
+import select
+import tarfile
+import threading
 import time
 import hashlib
+import functools
 import re
 
 
@@ -141,8 +146,8 @@ class _RemoteExecutionOutputs(TypedDict):
 
 class RemoteExecutionProvider(pulumi.dynamic.ResourceProvider):
     """Executes the scripts in setup-scripts/<script_name> on the remote
-    host. In particular, this uploads the entire folder and runs main.sh,
-    then deletes the folder. The started working directory is a subdirectory
+    host. In particular, this uploads the entire folder over sftp as a single
+    archive and runs main.sh, then deletes the folder. The started working directory is a subdirectory
     of "/usr/local/src"
     """
 
@@ -229,97 +234,58 @@ class RemoteExecutionProvider(pulumi.dynamic.ResourceProvider):
         if shared_script_name is not None:
             dirhash += "+" + hash_directory(shared_script_name)
 
-        single_file_script = io.StringIO()
-        single_file_script.write("cd /usr/local/src\n")
-        single_file_script.write('echo "sfs here 0"\n')
-
         remote_dir = secrets.token_hex(8)
-        key_file = None if bastion is None else secrets.token_hex(8)
-        write_echo_commands_for_folder(
-            script_name,
+        archive_iden = secrets.token_hex(8) + ".tar.gz"
+        archive = make_script_archive(
             remote_dir,
-            single_file_script,
+            script_name,
+            shared_script_name=shared_script_name,
             file_substitutions=file_substitutions,
         )
 
-        if shared_script_name is not None:
-            write_echo_commands_for_folder(
-                shared_script_name,
-                os.path.join(remote_dir, "shared"),
-                single_file_script,
-                file_substitutions=file_substitutions,
-            )
-
-        if bastion is None:
-            single_file_script.write(f"cd {remote_dir}\n")
-            single_file_script.write(f"bash {entrypoint}\n")
-            single_file_script.write("cd ..\n")
-        else:
-            write_echo_commands_for_file(
-                private_key, key_file, single_file_script, mark_executable=False
-            )
-            single_file_script.write(f"chmod 400 {key_file}\n")
-            single_file_script.write('echo "sfs here 1"\n')
-            single_file_script.write(
-                f"while ! ssh -i {key_file} -oStrictHostKeyChecking=no -oBatchMode=no ec2-user@{host} true\n"
-            )
-            single_file_script.write("do\n")
-            single_file_script.write("  sleep 1\n")
-            single_file_script.write("done\n")
-
-            single_file_script.write(
-                f"sftp -i {key_file} -oStrictHostKeyChecking=no -oBatchMode=no -b - ec2-user@{host} <<EOF\n"
-            )
-            single_file_script.write(f"put -r {remote_dir}\n")
-            single_file_script.write("EOF\n")
-            single_file_script.write('echo "sfs here 2"\n')
-            single_file_script.write(
-                f"ssh -i {key_file} -oStrictHostKeyChecking=no -oBatchMode=no ec2-user@{host} <<EOF\n"
-            )
-            single_file_script.write(f"cd {remote_dir}\n")
-            single_file_script.write(f"sudo bash {entrypoint}\n")
-            single_file_script.write("cd ..\n")
-            single_file_script.write(f"rm -rf {remote_dir}\n")
-            single_file_script.write("EOF\n")
-            single_file_script.write('echo "sfs here 3"\n')
-
-        single_file_script.write(f"rm -rf {remote_dir}\n")
-
-        if bastion is not None:
-            single_file_script.write(f"rm -f {key_file}\n")
-
-        single_file_script_str = single_file_script.getvalue()
+        single_file_script_str = "".join(
+            [
+                "set -e\n",
+                "mkdir -p /usr/local/src\n",
+                f"tar xzf /home/ec2-user/{archive_iden} -C /usr/local/src\n",
+                f"rm -f /home/ec2-user/{archive_iden}\n",
+                f"cd /usr/local/src/{remote_dir}\n",
+                "set +e\n",
+                f"bash {entrypoint} < /dev/null\n",
+                "rc=$?\n",
+                "cd ..\n",
+                f"rm -rf {remote_dir}\n",
+                "exit $rc\n",
+            ]
+        )
 
-        for _ in range(150):
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # the pool only makes us wait on connects to this host or its bastion,
+        # so this budget is spent on this host's own attempts. it is at least
+        # the old 150 attempts at 2s apart plus their 5s connect timeouts
+        backoff = 0.5
+        deadline = time.monotonic() + 1050
+        while True:
             try:
-                client.connect(
-                    hostname=host if bastion is None else bastion,
-                    username="ec2-user",
-                    key_filename=private_key,
-                    look_for_keys=False,
-                    auth_timeout=5,
-                    banner_timeout=5,
-                )
+                client = _ssh_pool.get(host, bastion, private_key)
             except Exception:
-                time.sleep(2)
+                if time.monotonic() + backoff > deadline:
+                    raise
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 16)
                 continue
-            sftp = client.open_sftp()
-
-            single_file_script_iden = secrets.token_hex(8) + ".sh"
-            single_file_script_remote_path = f"/home/ec2-user/{single_file_script_iden}"
-            with sftp.open(single_file_script_remote_path, "w") as remote_file:
-                remote_file.write(single_file_script_str)
 
-            sftp.chmod(single_file_script_remote_path, 0o755)
-            sftp.close()
+            try:
+                sftp = client.open_sftp()
+                sftp.putfo(io.BytesIO(archive), f"/home/ec2-user/{archive_iden}")
 
-            exec_simple(client, "cd ~")
-            stdout, stderr = exec_simple(client, f"sudo bash {single_file_script_iden}")
-            exec_simple(client, f"rm {single_file_script_iden}")
+                sftp.close()
 
-            client.close()
+                stdout, stderr = exec_simple(
+                    client, "cd ~ && sudo bash -s", stdin=single_file_script_str
+                )
+            except Exception:
+                _ssh_pool.discard(host, bastion, private_key)
+                raise
 
             return _RemoteExecutionOutputs(
                 stdout=stdout,
@@ -390,146 +356,385 @@ class RemoteExecution(pulumi.dynamic.Resource):
 
 
 def exec_simple(
-    client: paramiko.SSHClient, command: str, timeout=15, cmd_timeout=3600
+    client: paramiko.SSHClient,
+    command: str,
+    timeout=15,
+    cmd_timeout=3600,
+    stdin: Optional[str] = None,
 ) -> Tuple[str, str]:
     """Executes the given command on the paramiko client, waiting for
-    the command to finish before returning the stdout and stderr
+    the command to finish before returning the stdout and stderr. Raises
+    an exception if the command exits with a nonzero status. If stdin is
+    specified, it is sent to the command and then stdin is closed.
     """
     chan = client.get_transport().open_session(timeout=timeout)
-    chan.settimeout(cmd_timeout)
+    chan.settimeout(None)
     chan.exec_command(command)
-    stdout = chan.makefile("r", 8192)
-    stderr = chan.makefile_stderr("r", 8192)
+    if stdin is not None:
+        chan.sendall(stdin.encode("utf-8"))
+        chan.shutdown_write()
 
     all_stdout = io.BytesIO()
     all_stderr = io.BytesIO()
 
-    while not chan.exit_status_ready():
-        time.sleep(0.1)
+    deadline = time.monotonic() + cmd_timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            chan.close()
+            raise Exception(f"{command=} did not finish within {cmd_timeout=}s")
+
+        select.select([chan], [], [], min(remaining, 1.0))
 
-        from_stdout = stdout.read(4096)
-        from_stderr = stderr.read(4096)
+        while chan.recv_ready():
+            all_stdout.write(chan.recv(65536))
 
-        if from_stdout is not None:
-            all_stdout.write(from_stdout)
+        while chan.recv_stderr_ready():
+            all_stderr.write(chan.recv_stderr(65536))
 
-        if from_stderr is not None:
-            all_stderr.write(from_stderr)
+        if (
+            chan.exit_status_ready()
+            and not chan.recv_ready()
+            and not chan.recv_stderr_ready()
+        ):
+            break
 
-    while from_stdout := stdout.read(4096):
+    # the exit status may arrive before the final data; drain until eof
+    while from_stdout := chan.recv(65536):
         all_stdout.write(from_stdout)
 
-    while from_stderr := stderr.read(4096):
+    while from_stderr := chan.recv_stderr(65536):
         all_stderr.write(from_stderr)
 
-    return all_stdout.getvalue().decode(
-        "utf-8", errors="replace"
-    ), all_stderr.getvalue().decode("utf-8", errors="replace")
+    stdout_str = all_stdout.getvalue().decode("utf-8", errors="replace")
+    stderr_str = all_stderr.getvalue().decode("utf-8", errors="replace")
+
+    exit_status = chan.recv_exit_status()
+    if exit_status != 0:
+        raise Exception(
+            f"{command=} exited with {exit_status=}: {stdout_str=}, {stderr_str=}"
+        )
+
+    return stdout_str, stderr_str
+
+
+class _SSHPool:
+    """Keeps ssh connections open across remote executions, so that each
+    host (and, in particular, the shared bastion) only pays for the tcp
+    handshake, key exchange and authentication once per pulumi run. Every
+    command opens a new session on the pooled transport.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        """Protects clients and key_locks. Never held while connecting"""
+
+        self._clients: Dict[Tuple[str, Optional[str], str], paramiko.SSHClient] = {}
+        """The open clients, keyed by (host, bastion, private_key)"""
+
+        self._key_locks: Dict[Tuple[str, Optional[str], str], threading.Lock] = {}
+        """Held while connecting to the corresponding key, so that concurrent
+        executions against the same host share one connection, while
+        executions against other hosts are not held up by it"""
+
+    def get(
+        self, host: str, bastion: Optional[str], private_key: str
+    ) -> paramiko.SSHClient:
+        """Returns an open client connected to the given host as ec2-user,
+        connecting if necessary. If a bastion is specified, the connection
+        to the host is tunneled through a direct-tcpip channel on the pooled
+        connection to the bastion, so the private key never needs to leave
+        this machine.
+
+        Args:
+            host (str): the address of the target machine; private if a
+                bastion is specified
+            bastion (str, None): the public address of the bastion, if any
+            private_key (str): the path to the private key for both the host
+                and, if specified, the bastion
+
+        Returns:
+            paramiko.SSHClient: the client connected to the host
+        """
+        key = (host, bastion, private_key)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # the bastion is only ever locked after a host behind it, so this
+        # cannot deadlock
+        with key_lock:
+            with self._lock:
+                client = self._clients.get(key)
+            if client is not None:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    return client
+                with self._lock:
+                    if self._clients.get(key) is client:
+                        del self._clients[key]
+                client.close()
+
+            sock = None
+            if bastion is not None:
+                sock = (
+                    self.get(bastion, None, private_key)
+                    .get_transport()
+                    .open_channel("direct-tcpip", (host, 22), ("", 0), timeout=5)
+                )
+
+            try:
+                client = _connect_client(host, private_key, sock=sock)
+            except Exception:
+                if sock is not None:
+                    sock.close()
+                raise
+
+            with self._lock:
+                self._clients[key] = client
+            return client
+
+    def discard(self, host: str, bastion: Optional[str], private_key: str) -> None:
+        """Closes the pooled client for the given host, if there is one, so
+        that the next get reconnects. The connection to the bastion is kept.
+        """
+        with self._lock:
+            client = self._clients.pop((host, bastion, private_key), None)
+        if client is not None:
+            client.close()
+
+    def close_all(self) -> None:
+        """Closes every pooled client"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+_ssh_pool = _SSHPool()
+atexit.register(_ssh_pool.close_all)
+
+
+def _connect_client(
+    hostname: str, private_key: str, sock: Optional[paramiko.Channel] = None
+) -> paramiko.SSHClient:
+    """Opens an ssh client to the given hostname as ec2-user, optionally over
+    an existing channel
+    """
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        client.connect(
+            hostname=hostname,
+            username="ec2-user",
+            pkey=_load_private_key(private_key),
+            look_for_keys=False,
+            timeout=5,
+            auth_timeout=5,
+            banner_timeout=5,
+            sock=sock,
+        )
+    except Exception:
+        client.close()
+        raise
+    return client
+
+
+@functools.lru_cache(maxsize=16)
+def _load_private_key(path: str) -> paramiko.PKey:
+    """Parses the OpenSSH private key at the given path. Every connection
+    uses the same key, so this is memoized rather than having paramiko
+    re-read the file for each connection.
+    """
+    errors = []
+    for key_class in (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey):
+        try:
+            return key_class.from_private_key_file(path)
+        except paramiko.SSHException as e:
+            errors.append(e)
+    raise Exception(f"unsupported private key at {path=}: {errors=}")
 
 
 def hash_directory(dirpath: str) -> str:
-    """Returns a stable hash of the given directory"""
-    hasher = hashlib.sha256()
+    """Returns a stable hash of the given directory. The same script folders
+    are hashed for every resource using them, so the digest is memoized on
+    the size and modification time of every file in the directory, which
+    only requires a stat per file rather than reading them.
+    """
+    signature = []
     for root, _, files in os.walk(dirpath):
         for file in files:
-            with open(os.path.join(root, file), "rb") as f:
-                hasher.update(f.read())
+            stat = os.stat(os.path.join(root, file))
+            signature.append((os.path.join(root, file), stat.st_mtime_ns, stat.st_size))
+    return _hash_files(tuple(signature))
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_files(signature: Tuple[Tuple[str, int, int], ...]) -> str:
+    """Hashes the contents of the files in the given signature, in order, as
+    produced by hash_directory
+    """
+    hasher = hashlib.sha256()
+    for path, _, _ in signature:
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
     return hasher.hexdigest()
 
 
-def write_echo_commands_for_folder(
-    infile_path: str,
-    echo_path: str,
-    writer: io.StringIO,
+def make_script_archive(
+    arcname: str,
+    script_name: str,
+    shared_script_name: Optional[str] = None,
     file_substitutions: Optional[Dict[str, Dict[str, str]]] = None,
-) -> None:
-    """Writes the appropriate commands to echo the local folder at infile_path
-    to the remote folder at echo_path. Only supports text files.
+) -> bytes:
+    """Packages the script folder, and the shared script folder under
+    "shared", into an in-memory gzipped tarball so that it can be uploaded
+    in one request, making the given substitutions first. Every file is
+    marked executable. Only supports text files.
+
+    Args:
+        arcname (str): the name of the folder within the archive which
+            contains the scripts
+        script_name (str): the path to the local script folder
+        shared_script_name (str, None): the path to the local shared script
+            folder, if any
+        file_substitutions (dict, None): the substitutions to make, keyed by
+            unix-style path relative to the script folder, as in
+            RemoteExecutionInputs.file_substitutions. The same substitutions
+            are applied to the shared script folder.
+
+    Returns:
+        bytes: the contents of the .tar.gz file
     """
-    writer.write(f"mkdir -p {echo_path.replace(os.path.sep, '/')}\n")
-    for root, _, files in os.walk(infile_path):
-        relative_root = os.path.relpath(root, infile_path)
-        if relative_root != ".":
-            writer.write(
-                f"mkdir -p {os.path.join(echo_path, relative_root).replace(os.path.sep, '/')}\n"
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as archive:
+        _add_folder_to_archive(archive, script_name, arcname, file_substitutions)
+        if shared_script_name is not None:
+            _add_folder_to_archive(
+                archive, shared_script_name, f"{arcname}/shared", file_substitutions
             )
+    return buf.getvalue()
+
+
+def _add_folder_to_archive(
+    archive: tarfile.TarFile,
+    local_root: str,
+    arcname_root: str,
+    file_substitutions: Optional[Dict[str, Dict[str, str]]] = None,
+) -> None:
+    """Adds the local folder at local_root to the archive at arcname_root,
+    rendering each file with the matching substitutions
+    """
+    mtime = int(time.time())
+    for root, _, files in os.walk(local_root):
+        relative_root = os.path.relpath(root, local_root)
+        relative_root = (
+            "" if relative_root == "." else relative_root.replace(os.path.sep, "/")
+        )
+        arcname_dir = (
+            f"{arcname_root}/{relative_root}" if relative_root else arcname_root
+        )
+
+        dir_info = tarfile.TarInfo(arcname_dir)
+        dir_info.type = tarfile.DIRTYPE
+        dir_info.mode = 0o755
+        dir_info.mtime = mtime
+        archive.addfile(dir_info)
 
         for file in files:
-            infile_filepath = os.path.join(root, file)
-            echo_file_path = os.path.join(
-                echo_path, relative_root if relative_root != "." else "", file
-            )
+            relative_path = f"{relative_root}/{file}" if relative_root else file
             this_file_subs = None
             if file_substitutions is not None:
-                echo_file_path_normalized = os.path.join(
-                    relative_root if relative_root != "." else "", file
-                ).replace(os.path.sep, "/")
-                this_file_subs = file_substitutions.get(echo_file_path_normalized)
-            write_echo_commands_for_file(
-                infile_filepath,
-                echo_file_path,
-                writer,
-                file_substitutions=this_file_subs,
-            )
+                this_file_subs = file_substitutions.get(relative_path)
 
-
-def write_echo_commands_for_file(
-    infile_path: str,
-    echo_file_path: str,
-    writer: io.StringIO,
-    mark_executable: bool = True,
-    file_substitutions: Optional[Dict[str, str]] = None,
-) -> None:
-    """Writes the appropriate c ommands to echo the local file at infile_path
-    to the remote file at echo_file_path. Only supports text files.
+            contents = render_file(os.path.join(root, file), this_file_subs).encode(
+                "utf-8"
+            )
+            file_info = tarfile.TarInfo(f"{arcname_dir}/{file}")
+            file_info.size = len(contents)
+            file_info.mode = 0o755
+            file_info.mtime = mtime
+            archive.addfile(file_info, io.BytesIO(contents))
+
+
+def render_file(
+    infile_path: str, file_substitutions: Optional[Dict[str, str]] = None
+) -> str:
+    """Reads the local text file at infile_path and returns its contents
+    after making the given substitutions. Trailing whitespace is stripped
+    from each line.
     """
-    echo_file_path = echo_file_path.replace(os.path.sep, "/")
+    pattern = (
+        compile_substitution_pattern(file_substitutions) if file_substitutions else None
+    )
+    parts: List[str] = []
     with open(infile_path, "r") as infile:
         for original_line in infile:
-            for line in apply_substitutions(original_line, file_substitutions):
-                cleaned_line = line.rstrip().replace("\\", "\\\\").replace("'", "\\'")
-                writer.write(f"echo $'{cleaned_line}' >> {echo_file_path}\n")
-
-    if mark_executable:
-        writer.write(f"chmod +x {echo_file_path}\n")
-    writer.write(f'echo "finished writing {echo_file_path}"\n')
-    # print file size:
-    writer.write(f"du -sh {echo_file_path}\n")
+            for line in apply_substitutions(
+                original_line, file_substitutions, pattern=pattern
+            ):
+                parts.append(line.rstrip())
+                parts.append("\n")
+    return "".join(parts)
 
 
 INDENTATION_PRESERVED_REGEX = re.compile(r"^(?P<indent>\s*)\{\{(?P<key>.+?)\}\}")
-SIMPLE_SUBSTITUTION_REGEX = re.compile(r"\{\{(?P<key>.+?)\}\}")
 
 
-def apply_substitutions(line: str, file_substitutions: Optional[Dict[str, str]] = None):
+def compile_substitution_pattern(file_substitutions: Dict[str, str]) -> re.Pattern:
+    """Compiles the pattern used to substitute into a file with the given
+    substitutions: the known keys go in the "key" group, and any other
+    placeholder goes in the "unknown" group
+    """
+    known = "|".join(re.escape(key) for key in file_substitutions)
+    return re.compile(r"\{\{(?:(?P<key>" + known + r")|(?P<unknown>.+?))\}\}")
+
+
+def apply_substitutions(
+    line: str,
+    file_substitutions: Optional[Dict[str, str]] = None,
+    *,
+    pattern: Optional[re.Pattern] = None,
+):
     """Applies the given substitutions to the given line. This acts in
     two formats - when the line consists of just whitespace followed
     by a single substitution and the substituted value contains newlines,
     then we will preserve indentation. So '  {{foo}}' where foo is 'a\nb'
     will be converted to '  a\n  b'.
 
-    In all other cases, the substitution is direct.
+    In all other cases, the substitution is direct, in a single pass so that
+    placeholders within substituted values are left alone. Every substitution
+    must have its key in file_substitutions. pattern is the result of
+    compile_substitution_pattern for file_substitutions, if already compiled.
 
     Returns the list of lines that were generated.
     """
-    if not file_substitutions:
+    if not file_substitutions or "{{" not in line:
         return [line]
 
-    if match := INDENTATION_PRESERVED_REGEX.match(line):
+    # most placeholders are mid-line, so only start the regex when the line
+    # could be a lone placeholder
+    if line.lstrip().startswith("{{") and (
+        match := INDENTATION_PRESERVED_REGEX.match(line)
+    ):
         indent = match.group("indent")
         key = match.group("key")
 
-        assert key in file_substitutions, f"{key=} not in {file_substitutions=}"
+        if key not in file_substitutions:
+            raise Exception(f"{key=} not in {file_substitutions=}")
 
         value = file_substitutions[key]
+        if "\n" in value:
+            return [indent + subline for subline in value.split("\n")]
 
-        result = []
-        for subline in value.split("\n"):
-            result.append(indent + subline)
-        return result
+    if pattern is None:
+        pattern = compile_substitution_pattern(file_substitutions)
 
-    return [
-        SIMPLE_SUBSTITUTION_REGEX.sub(
-            lambda m: file_substitutions.get(m.group("key"), ""), line
-        )
-    ]
+    def substitute(match: re.Match) -> str:
+        if match.group("unknown") is not None:
+            key = match.group("unknown")
+            raise Exception(f"{key=} not in {file_substitutions=}")
+        return file_substitutions[match.group("key")]
+
+    return [pattern.sub(substitute, line)]
@@ -1,8 +1,7 @@
 """Constructs the appropriate number of reverse proxies on the
 given subnets.
 """
-import itertools
-from typing import List, Sequence, Tuple
+from typing import Dict, List, Sequence
 import pulumi
 import pulumi_aws as aws
 from key import Key
@@ -81,9 +80,7 @@ class ReverseProxy:
                         from_port=22,
                         protocol="tcp",
                         to_port=22,
-                        cidr_blocks=[
-                            self.vpc.bastion.private_ip.apply(lambda ip: f"{ip}/32")
-                        ],
+                        cidr_blocks=[self.vpc.bastion_cidr],
                     ),
                 ],
                 egress=[
@@ -119,30 +116,36 @@ class ReverseProxy:
         ]
         """The reverse proxy instances"""
 
+        nginx_upstreams: pulumi.Output[Dict[str, str]] = pulumi.Output.all(
+            BACKEND_UPSTREAM=get_upstreams(self.rest_backend),
+            WEBSOCKET_UPSTREAM=get_upstreams(self.ws_backend),
+            EMAIL_TEMPLATE_UPSTREAM=get_upstreams(
+                self.email_template_backend, disable_fail_time=True
+            ),
+            FRONTEND_UPSTREAM=get_upstreams(self.frontend, disable_fail_time=True),
+            FRONTEND_SSR_UPSTREAM=get_upstreams(
+                self.frontend_ssr, disable_fail_time=True
+            ),
+        )
+        file_substitutions = nginx_upstreams.apply(
+            lambda upstreams: {"nginx.conf": upstreams}
+        )
+        """The upstreams substituted into nginx.conf, shared by every reverse proxy"""
+
+        common_remote_execution_args = dict(
+            private_key=self.vpc.key.private_key_path,
+            bastion=self.vpc.bastion.public_ip,
+            shared_script_name="scripts/shared",
+        )
+
         self.reverse_proxy_installs: List[RemoteExecution] = [
             RemoteExecution(
                 f"{resource_name}-reverse-proxy-installs-{idx}",
                 RemoteExecutionInputs(
                     script_name="setup-scripts/reverse-proxy",
-                    file_substitutions={
-                        "nginx.conf": {
-                            "BACKEND_UPSTREAM": get_upstreams(self.rest_backend),
-                            "WEBSOCKET_UPSTREAM": get_upstreams(self.ws_backend),
-                            "EMAIL_TEMPLATE_UPSTREAM": get_upstreams(
-                                self.email_template_backend, disable_fail_time=True
-                            ),
-                            "FRONTEND_UPSTREAM": get_upstreams(
-                                self.frontend, disable_fail_time=True
-                            ),
-                            "FRONTEND_SSR_UPSTREAM": get_upstreams(
-                                self.frontend_ssr, disable_fail_time=True
-                            ),
-                        }
-                    },
+                    file_substitutions=file_substitutions,
                     host=instance.private_ip,
-                    private_key=self.vpc.key.private_key_path,
-                    bastion=self.vpc.bastion.public_ip,
-                    shared_script_name="scripts/shared",
+                    **common_remote_execution_args,
                 ),
             )
             for idx, instance in enumerate(self.reverse_proxies)
@@ -170,27 +173,15 @@ def get_upstreams(
             during updates. Otherwise, we reduce fail time to 3s from the
             default of 10s
     """
-    all_instances: List[aws.ec2.Instance] = list(
-        itertools.chain(
-            *[
-                (inst for inst in subnet_insts)
-                for subnet_insts in webapp.instances_by_subnet
-            ]
-        )
-    )
+    all_instances: List[aws.ec2.Instance] = [
+        inst for subnet_insts in webapp.instances_by_subnet for inst in subnet_insts
+    ]
 
-    def make_upstream_item(ip_address: str) -> str:
-        res = f"server {ip_address}:80"
-        if disable_fail_time:
-            res += " max_fails=0"
-        else:
-            res += " fail_timeout=3s"
-        res += ";"
-        return res
+    suffix = " max_fails=0;" if disable_fail_time else " fail_timeout=3s;"
 
-    def make_upstream(ip_addresses: Tuple[Sequence[str]]) -> str:
-        return "\n".join(make_upstream_item(ip) for ip in ip_addresses[0])
+    def make_upstream(ip_addresses: Sequence[str]) -> str:
+        return "\n".join(f"server {ip}:80{suffix}" for ip in ip_addresses)
 
-    return pulumi.Output.all([inst.private_ip for inst in all_instances]).apply(
+    return pulumi.Output.all(*[inst.private_ip for inst in all_instances]).apply(
         make_upstream
     )
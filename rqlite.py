@@ -1,7 +1,7 @@
 """This module allows creating a rqlite cluster"""
 
-import json
-from typing import List, Optional, Union, Literal
+import functools
+from typing import Dict, List, Optional, Tuple, Union, Literal
 from remote_executor import RemoteExecution, RemoteExecutionInputs
 from vpc import VirtualPrivateCloud
 import pulumi_aws as aws
@@ -48,6 +48,13 @@ class RqliteCluster:
         self.id_offset: int = id_offset
         """the number of rotated out instances"""
 
+        num_subnets = len(self.vpc.private_subnets)
+        maintenance_allowed_by_subnet: List[bool] = [
+            allow_maintenance_subnet_idx == "all"
+            or allow_maintenance_subnet_idx == subnet_idx
+            for subnet_idx in range(num_subnets)
+        ]
+
         self.security_group: aws.ec2.SecurityGroup = aws.ec2.SecurityGroup(
             f"{resource_name}-security-group",
             description="allows incoming 4001-4002 tcp (rqlite) + ssh from bastion",
@@ -63,9 +70,7 @@ class RqliteCluster:
                     from_port=22,
                     to_port=22,
                     protocol="tcp",
-                    cidr_blocks=[
-                        self.vpc.bastion.private_ip.apply(lambda ip: f"{ip}/32")
-                    ],
+                    cidr_blocks=[self.vpc.bastion_cidr],
                 ),
             ],
             egress=[
@@ -76,11 +81,8 @@ class RqliteCluster:
             tags={"Name": f"{resource_name} rqlite"},
         )
 
-        self.instance_cluster_ids = list(
-            range(
-                id_offset + 1,
-                id_offset + 1 + len(self.vpc.private_subnets),
-            )
+        self.instance_cluster_ids: Tuple[int, ...] = tuple(
+            range(id_offset + 1, id_offset + 1 + num_subnets)
         )
         """The cluster id for each instance, with index-correspondance to instances"""
 
@@ -90,9 +92,7 @@ class RqliteCluster:
                 ami=self.vpc.amazon_linux_bleeding_arm64.id,
                 associate_public_ip_address=False,
                 instance_type="t4g.medium",
-                subnet_id=self.vpc.private_subnets[
-                    cluster_id % len(self.vpc.private_subnets)
-                ],
+                subnet_id=self.vpc.private_subnets[cluster_id % num_subnets],
                 key_name=self.vpc.key.key_pair.key_name,
                 vpc_security_group_ids=[self.security_group.id],
                 iam_instance_profile=self.vpc.standard_instance_profile.name,
@@ -100,27 +100,19 @@ class RqliteCluster:
                     iops=3000, throughput=125, volume_size=32, volume_type="gp3"
                 ),
                 tags={
-                    "Name": f"{resource_name} {vpc.availability_zones[cluster_id % len(self.vpc.private_subnets)]} [{cluster_id}]",
+                    "Name": f"{resource_name} {vpc.availability_zones[cluster_id % num_subnets]} [{cluster_id}]",
                     "Time": str(int(time.time())),
                 },
                 opts=pulumi.ResourceOptions(
                     delete_before_replace=True,
                     ignore_changes=(
-                        ["ami", "instance_type", "tags", "root_block_device"]
-                        if allow_maintenance_subnet_idx != "all"
-                        and (
-                            allow_maintenance_subnet_idx
-                            != (cluster_id % len(self.vpc.private_subnets))
-                        )
-                        else []
+                        []
+                        if maintenance_allowed_by_subnet[cluster_id % num_subnets]
+                        else ["ami", "instance_type", "tags", "root_block_device"]
                     ),
                     replace_on_changes=(
                         ["tags"]
-                        if allow_maintenance_subnet_idx != "all"
-                        and (
-                            allow_maintenance_subnet_idx
-                            == (cluster_id % len(self.vpc.private_subnets))
-                        )
+                        if allow_maintenance_subnet_idx == cluster_id % num_subnets
                         else None
                     ),
                 ),
@@ -134,55 +126,61 @@ class RqliteCluster:
         the desired "increment cluster id offset by 1 to swap 1 instance out" behavior
         """
 
+        self.all_private_ips: pulumi.Output[List[str]] = pulumi.Output.all(
+            *[instance.private_ip for instance in self.instances]
+        )
+        """the private ips of the instances, in the same order as instances"""
+
+        def generate_file_substitutions(
+            instance_ips: List[str], idx: int, cluster_id: int
+        ) -> Dict[str, Dict[str, str]]:
+            my_ip = instance_ips[idx]
+
+            return {
+                "config.sh": {
+                    "NODE_ID": str(cluster_id),
+                    "DEFAULT_LEADER_NODE_ID": str(self.instance_cluster_ids[0]),
+                    "MY_IP": my_ip,
+                    "JOIN_ADDRESS": ",".join(f"{ip}:4002" for ip in instance_ips),
+                    "NUM_NODES": str(len(instance_ips)),
+                },
+                "peers.json": {
+                    # ids and ips need no escaping; this matches json.dumps exactly
+                    "PEERS": "["
+                    + ", ".join(
+                        f'{{"id": "{node_id}", "address": "{ip}:4002", "non_voter": false}}'
+                        for node_id, ip in zip(self.instance_cluster_ids, instance_ips)
+                    )
+                    + "]"
+                },
+            }
+
+        common_remote_execution_args = dict(
+            private_key=self.vpc.key.private_key_path,
+            bastion=self.vpc.bastion.public_ip,
+            shared_script_name="setup-scripts/shared",
+        )
+
+        # each execution only depends on the instances' ips, never on another
+        # execution, so pulumi bootstraps every node concurrently
         self.remote_executions: List[RemoteExecution] = []
         for instance_idx, cluster_id_outer, instance in zip(
             range(len(self.instances)), self.instance_cluster_ids, self.instances
         ):
-
-            def generate_file_substitutions(args):
-                idx = args[-1]
-                cluster_id: int = args[-2]
-                instance_ips: List[str] = args[:-2]
-                my_ip = instance_ips[idx]
-
-                return {
-                    "config.sh": {
-                        "NODE_ID": str(cluster_id),
-                        "DEFAULT_LEADER_NODE_ID": str(self.instance_cluster_ids[0]),
-                        "MY_IP": my_ip,
-                        "JOIN_ADDRESS": ",".join(f"{ip}:4002" for ip in instance_ips),
-                        "NUM_NODES": str(len(instance_ips)),
-                    },
-                    "peers.json": {
-                        "PEERS": json.dumps(
-                            [
-                                {
-                                    "id": str(node_id),
-                                    "address": f"{ip}:4002",
-                                    "non_voter": False,
-                                }
-                                for node_id, ip in zip(
-                                    self.instance_cluster_ids, instance_ips
-                                )
-                            ]
-                        )
-                    },
-                }
-
             self.remote_executions.append(
                 RemoteExecution(
                     f"{resource_name}-remote-execution-{cluster_id_outer}",
                     props=RemoteExecutionInputs(
                         script_name="setup-scripts/rqlite",
-                        file_substitutions=pulumi.Output.all(
-                            *[i.private_ip for i in self.instances],
-                            cluster_id_outer,
-                            instance_idx,
-                        ).apply(generate_file_substitutions),
+                        file_substitutions=self.all_private_ips.apply(
+                            functools.partial(
+                                generate_file_substitutions,
+                                idx=instance_idx,
+                                cluster_id=cluster_id_outer,
+                            )
+                        ),
                         host=instance.private_ip,
-                        private_key=self.vpc.key.private_key_path,
-                        bastion=self.vpc.bastion.public_ip,
-                        shared_script_name="setup-scripts/shared",
+                        **common_remote_execution_args,
                     ),
                     opts=pulumi.ResourceOptions(
                         ignore_changes=[
@@ -193,13 +191,9 @@ class RqliteCluster:
                                     "script_name",
                                     "shared_script_name",
                                 ]
-                                if allow_maintenance_subnet_idx != "all"
-                                and (
-                                    allow_maintenance_subnet_idx
-                                    != (
-                                        cluster_id_outer % len(self.vpc.private_subnets)
-                                    )
-                                )
+                                if not maintenance_allowed_by_subnet[
+                                    cluster_id_outer % num_subnets
+                                ]
                                 else []
                             ),
                         ],
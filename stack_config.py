@@ -0,0 +1,248 @@
+"""Loads the pulumi stack configuration exactly once into a frozen snapshot"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import ipaddress
+import re
+import pulumi
+
+_DEVELOPMENT_EXPO_URL_RE = re.compile(r"exp://(\d{1,3}(?:\.\d{1,3}){3}):19000/?")
+"""Matches a valid development expo url, capturing the ipv4 address"""
+
+
+def _validate_development_expo_url(idx: int, url_str: str) -> str:
+    """It's easy to misuse development_expo_urls, so we make sure each one
+    is of the form exp://<private ipv4>:19000, raising an exception if not.
+
+    Args:
+        idx (int): the index of the url within development_expo_urls, for
+            error messages
+        url_str (str): the url to validate
+
+    Returns:
+        str: the url, unchanged
+    """
+    match = _DEVELOPMENT_EXPO_URL_RE.fullmatch(url_str)
+    assert (
+        match is not None
+    ), f"development_expo_urls[{idx}]: expected {url_str=} to be of the form exp://<ipv4>:19000"
+    try:
+        ip = ipaddress.IPv4Address(match.group(1))
+    except ValueError as e:
+        raise Exception(
+            f"development_expo_urls[{idx}]: expected {url_str=} hostname to be an IP address, got {match.group(1)=}"
+        ) from e
+
+    assert (
+        ip.is_private
+    ), f"development_expo_urls[{idx}]: expected {url_str=} hostname to be private, got {match.group(1)=}"
+    return url_str
+
+
+@dataclass(frozen=True, slots=True)
+class StackConfig:
+    """The values read from the pulumi stack configuration. Each value is
+    looked up (and, for secrets, wrapped into an output) exactly once by
+    load, after which the rest of the program only uses attribute access.
+    """
+
+    github_username: str
+    github_pat: pulumi.Output[str]
+    domain: str
+    rqlite_id_offset: int
+    deployment_secret: pulumi.Output[str]
+    slack_web_errors_url: pulumi.Output[str]
+    slack_ops_url: pulumi.Output[str]
+    slack_oseh_bot_url: pulumi.Output[str]
+    slack_oseh_classes_url: pulumi.Output[str]
+    google_oidc_client_id: str
+    google_oidc_client_secret: pulumi.Output[str]
+    expo_username: str
+    expo_app_slug: str
+    development_expo_urls: Tuple[str, ...]
+    """the expo urls for local development, already validated; empty on most stacks"""
+    webapp_counter: Optional[int]
+    """the webapp counter doesn't do anything, but changing it will rebuild all the webapps--useful for testing"""
+    apple_app_id_team_id: str
+    apple_services_id: str
+    apple_key_id: str
+    apple_key_file: str
+    """the path to the apple private key; the key itself is only read when
+    rendering the webapp configuration"""
+    image_file_jwt_secret: pulumi.Output[str]
+    file_upload_jwt_secret: pulumi.Output[str]
+    content_file_jwt_secret: pulumi.Output[str]
+    journey_jwt_secret: pulumi.Output[str]
+    daily_event_jwt_secret: pulumi.Output[str]
+    interactive_prompt_jwt_secret: pulumi.Output[str]
+    id_token_secret: pulumi.Output[str]
+    refresh_token_secret: pulumi.Output[str]
+    course_jwt_secret: pulumi.Output[str]
+    revenue_cat_secret_key: pulumi.Output[str]
+    revenue_cat_stripe_public_key: pulumi.Output[str]
+    revenue_cat_google_play_public_key: pulumi.Output[str]
+    revenue_cat_apple_public_key: pulumi.Output[str]
+    stripe_secret_key: pulumi.Output[str]
+    stripe_public_key: pulumi.Output[str]
+    stripe_price_id: str
+    twilio_account_sid: str
+    twilio_auth_token: pulumi.Output[str]
+    twilio_phone_number: str
+    twilio_verify_service_sid: str
+    twilio_message_service_sid: str
+    klaviyo_api_key: pulumi.Output[str]
+    oseh_openai_api_key: pulumi.Output[str]
+    oseh_pexels_api_key: pulumi.Output[str]
+    oseh_stability_ai_key: pulumi.Output[str]
+    oseh_play_ht_user_id: str
+    oseh_play_ht_api_key: pulumi.Output[str]
+    oseh_reddit_client_id: pulumi.Output[str]
+    oseh_reddit_client_secret: pulumi.Output[str]
+    oseh_mastodon_client_id: pulumi.Output[str]
+    oseh_mastodon_client_secret: pulumi.Output[str]
+    oseh_mastodon_access_token: pulumi.Output[str]
+    oseh_direct_account_client_id: pulumi.Output[str]
+    oseh_direct_account_client_secret: pulumi.Output[str]
+    oseh_direct_account_redirect_path: str
+    oseh_direct_account_jwt_secret: pulumi.Output[str]
+    oseh_csrf_jwt_secret_web: pulumi.Output[str]
+    oseh_csrf_jwt_secret_native: pulumi.Output[str]
+    oseh_expo_notification_access_token: pulumi.Output[str]
+    oseh_email_template_jwt_secret: pulumi.Output[str]
+    oseh_siwo_jwt_secret: pulumi.Output[str]
+    oseh_merge_jwt_secret: pulumi.Output[str]
+    oseh_transcript_jwt_secret: pulumi.Output[str]
+    oseh_progress_jwt_secret: pulumi.Output[str]
+    revenue_cat_v2_secret_key: pulumi.Output[str]
+    oseh_gender_api_key: pulumi.Output[str]
+    oseh_client_screen_jwt_secret: pulumi.Output[str]
+    oseh_journal_jwt_secret: pulumi.Output[str]
+    oseh_voice_note_jwt_secret: pulumi.Output[str]
+
+    @classmethod
+    def load(cls, config: pulumi.Config) -> "StackConfig":
+        """Reads every value from the given pulumi config. This should be
+        called once per program; the result should be passed around rather
+        than re-reading the config.
+
+        Args:
+            config (pulumi.Config): the config for the current project
+
+        Returns:
+            StackConfig: the snapshot of the config
+        """
+        rqlite_id_offset = config.get_int("rqlite_id_offset")
+        return cls(
+            github_username=config.require("github_username"),
+            github_pat=config.require_secret("github_pat"),
+            domain=config.require("domain"),
+            rqlite_id_offset=rqlite_id_offset if rqlite_id_offset is not None else 0,
+            deployment_secret=config.require_secret("deployment_secret"),
+            slack_web_errors_url=config.require_secret("slack_web_errors_url"),
+            slack_ops_url=config.require_secret("slack_ops_url"),
+            slack_oseh_bot_url=config.require_secret("slack_oseh_bot_url"),
+            slack_oseh_classes_url=config.require_secret("slack_oseh_classes_url"),
+            google_oidc_client_id=config.require("google_oidc_client_id"),
+            google_oidc_client_secret=config.require_secret(
+                "google_oidc_client_secret"
+            ),
+            expo_username=config.require("expo_username"),
+            expo_app_slug=config.require("expo_app_slug"),
+            development_expo_urls=tuple(
+                _validate_development_expo_url(idx, url_str)
+                for idx, url_str in enumerate(
+                    u
+                    for u in config.get("development_expo_urls", default="").split(",")
+                    if u != ""
+                )
+            ),
+            webapp_counter=config.get_int("webapp_counter"),
+            apple_app_id_team_id=config.require("apple_app_id_team_id"),
+            apple_services_id=config.require("apple_services_id"),
+            apple_key_id=config.require("apple_key_id"),
+            apple_key_file=config.require("apple_key_file"),
+            image_file_jwt_secret=config.require_secret("image_file_jwt_secret"),
+            file_upload_jwt_secret=config.require_secret("file_upload_jwt_secret"),
+            content_file_jwt_secret=config.require_secret("content_file_jwt_secret"),
+            journey_jwt_secret=config.require_secret("journey_jwt_secret"),
+            daily_event_jwt_secret=config.require_secret("daily_event_jwt_secret"),
+            interactive_prompt_jwt_secret=config.require_secret(
+                "interactive_prompt_jwt_secret"
+            ),
+            id_token_secret=config.require_secret("id_token_secret"),
+            refresh_token_secret=config.require_secret("refresh_token_secret"),
+            course_jwt_secret=config.require_secret("course_jwt_secret"),
+            revenue_cat_secret_key=config.require_secret("revenue_cat_secret_key"),
+            revenue_cat_stripe_public_key=config.require_secret(
+                "revenue_cat_stripe_public_key"
+            ),
+            revenue_cat_google_play_public_key=config.require_secret(
+                "revenue_cat_google_play_public_key"
+            ),
+            revenue_cat_apple_public_key=config.require_secret(
+                "revenue_cat_apple_public_key"
+            ),
+            stripe_secret_key=config.require_secret("stripe_secret_key"),
+            stripe_public_key=config.require_secret("stripe_public_key"),
+            stripe_price_id=config.require("stripe_price_id"),
+            twilio_account_sid=config.require("twilio_account_sid"),
+            twilio_auth_token=config.require_secret("twilio_auth_token"),
+            twilio_phone_number=config.require("twilio_phone_number"),
+            twilio_verify_service_sid=config.require("twilio_verify_service_sid"),
+            twilio_message_service_sid=config.require("twilio_message_service_sid"),
+            klaviyo_api_key=config.require_secret("klaviyo_api_key"),
+            oseh_openai_api_key=config.require_secret("oseh_openai_api_key"),
+            oseh_pexels_api_key=config.require_secret("oseh_pexels_api_key"),
+            oseh_stability_ai_key=config.require_secret("oseh_stability_ai_key"),
+            oseh_play_ht_user_id=config.require("oseh_play_ht_user_id"),
+            oseh_play_ht_api_key=config.require_secret("oseh_play_ht_api_key"),
+            oseh_reddit_client_id=config.require_secret("oseh_reddit_client_id"),
+            oseh_reddit_client_secret=config.require_secret(
+                "oseh_reddit_client_secret"
+            ),
+            oseh_mastodon_client_id=config.require_secret("oseh_mastodon_client_id"),
+            oseh_mastodon_client_secret=config.require_secret(
+                "oseh_mastodon_client_secret"
+            ),
+            oseh_mastodon_access_token=config.require_secret(
+                "oseh_mastodon_access_token"
+            ),
+            oseh_direct_account_client_id=config.require_secret(
+                "oseh_direct_account_client_id"
+            ),
+            oseh_direct_account_client_secret=config.require_secret(
+                "oseh_direct_account_client_secret"
+            ),
+            oseh_direct_account_redirect_path=config.require(
+                "oseh_direct_account_redirect_path"
+            ),
+            oseh_direct_account_jwt_secret=config.require_secret(
+                "oseh_direct_account_jwt_secret"
+            ),
+            oseh_csrf_jwt_secret_web=config.require_secret("oseh_csrf_jwt_secret_web"),
+            oseh_csrf_jwt_secret_native=config.require_secret(
+                "oseh_csrf_jwt_secret_native"
+            ),
+            oseh_expo_notification_access_token=config.require_secret(
+                "oseh_expo_notification_access_token"
+            ),
+            oseh_email_template_jwt_secret=config.require_secret(
+                "oseh_email_template_jwt_secret"
+            ),
+            oseh_siwo_jwt_secret=config.require_secret("oseh_siwo_jwt_secret"),
+            oseh_merge_jwt_secret=config.require_secret("oseh_merge_jwt_secret"),
+            oseh_transcript_jwt_secret=config.require_secret(
+                "oseh_transcript_jwt_secret"
+            ),
+            oseh_progress_jwt_secret=config.require_secret("oseh_progress_jwt_secret"),
+            revenue_cat_v2_secret_key=config.require_secret(
+                "revenue_cat_v2_secret_key"
+            ),
+            oseh_gender_api_key=config.require_secret("oseh_gender_api_key"),
+            oseh_client_screen_jwt_secret=config.require_secret(
+                "oseh_client_screen_jwt_secret"
+            ),
+            oseh_journal_jwt_secret=config.require_secret("oseh_journal_jwt_secret"),
+            oseh_voice_note_jwt_secret=config.require_secret(
+                "oseh_voice_note_jwt_secret"
+            ),
+        )
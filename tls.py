@@ -2,7 +2,7 @@
 load balancer to interface with route53, and then connects the
 load balancer to target the given reverse proxy instances.
 """
-from typing import List
+from typing import List, Optional
 import pulumi
 import pulumi_aws as aws
 
@@ -23,6 +23,8 @@ class TransportLayerSecurity:
         vpc: pulumi.Input[str],
         subnets: pulumi.Input[List[str]],
         targets: pulumi.Input[List[str]],
+        certificate_arn: Optional[pulumi.Input[str]] = None,
+        zone_id: Optional[pulumi.Input[str]] = None,
     ) -> None:
         """Creates a new set of transport layer security over the given domain
         within the given region to target the given reverse proxies.
@@ -37,6 +39,12 @@ class TransportLayerSecurity:
             subnets (list[Input[str]]): the ids of the subnets the targets are in.
             targets (list[Input[str]]): the ids of the ec2 instances which should
                 receive HTTP requests over port 80
+            certificate_arn (Input[str], None): If specified, the arn of an existing
+                certificate covering the domain and its subdomains, e.g., a shared
+                wildcard certificate. The certificate and its validation records are
+                then not created here, skipping DNS validation entirely.
+            zone_id (Input[str], None): If specified, the id of the route53 zone for
+                the domain, in which case the zone is not looked up by name.
         """
         self.resource_name: str = resource_name
         """The resource name prefix we use for all resources we create, e.g., 'tls'"""
@@ -46,17 +54,17 @@ class TransportLayerSecurity:
         "google.com."
         """
 
+        self.domain_without_trailing_dot: str = domain.rstrip(".")
+        """The domain that receives requests without the trailing dot. For
+        example, "google.com"
+        """
+
         self.vpc: pulumi.Output[str] = pulumi.Output.from_input(vpc)
         """The id of the virtual private cloud containing the targets"""
 
         self.subnets: pulumi.Output[List[str]] = pulumi.Output.from_input(subnets)
         """The subnets which contain all of the targets"""
 
-        self.targets: pulumi.Output[List[str]] = pulumi.Output.from_input(targets)
-        """The ids of the ec2 instances that will receive HTTP requests
-        over port 80
-        """
-
         self.security_group: aws.ec2.SecurityGroup = aws.ec2.SecurityGroup(
             f"{resource_name}-security-group",
             vpc_id=self.vpc,
@@ -116,59 +124,96 @@ class TransportLayerSecurity:
         """The attachments for each target to the target group
         """
 
-        self.route53_zone: aws.route53.Zone = aws.route53.get_zone(name=domain)
-        """The route53 zone corresponding to the domain"""
+        if zone_id is None:
+            self.route53_zone: Optional[
+                pulumi.Output[aws.route53.GetZoneResult]
+            ] = aws.route53.get_zone_output(name=domain)
+            """The route53 zone corresponding to the domain. None if the zone id
+            was provided, in which case the zone is not looked up."""
 
-        domain_without_trailing_dot = domain.rstrip(".")
-        self.certificate: aws.acm.Certificate = aws.acm.Certificate(
-            f"{resource_name}-certificate",
-            domain_name=domain_without_trailing_dot,
-            subject_alternative_names=[f"*.{domain_without_trailing_dot}"],
-            validation_method="DNS",
-        )
-        """The certificate that we requested that AWS Amazon Certiface Manager
-        create on our behalf for our domain and all subdomains
-        """
+            self.route53_zone_id: pulumi.Output[str] = self.route53_zone.zone_id
+            """The id of the route53 zone corresponding to the domain, shared by
+            everything creating records in the zone"""
+        else:
+            self.route53_zone = None
+            self.route53_zone_id = pulumi.Output.from_input(zone_id)
 
-        self.validation_records: List[aws.route53.Record] = [
-            aws.route53.Record(
-                f"{resource_name}-validation-record-{idx}",
-                allow_overwrite=True,
-                name=self.certificate.domain_validation_options.apply(
-                    lambda opts: opts[idx].resource_record_name
-                ),
-                records=[
-                    self.certificate.domain_validation_options.apply(
-                        lambda opts: opts[idx].resource_record_value
-                    )
-                ],
-                ttl=60,
-                type=self.certificate.domain_validation_options.apply(
-                    lambda opts: opts[idx].resource_record_type
-                ),
-                zone_id=self.route53_zone.zone_id,
+        domain_without_trailing_dot = self.domain_without_trailing_dot
+
+        if certificate_arn is None:
+            self.certificate: Optional[aws.acm.Certificate] = aws.acm.Certificate(
+                f"{resource_name}-certificate",
+                domain_name=domain_without_trailing_dot,
+                subject_alternative_names=[f"*.{domain_without_trailing_dot}"],
+                validation_method="DNS",
+            )
+            """The certificate that we requested that AWS Amazon Certiface Manager
+            create on our behalf for our domain and all subdomains. None if an
+            existing certificate was provided.
+            """
+
+            validation_options = self.certificate.domain_validation_options.apply(
+                lambda opts: [
+                    {
+                        "name": opt.resource_record_name,
+                        "value": opt.resource_record_value,
+                        "type": opt.resource_record_type,
+                    }
+                    for opt in opts
+                ]
             )
-            for idx in range(2)
-        ]
-        """The validation records required to show the amazon certificate manager
-        that we indeed own the domain. Pulumi doesn't let us create the "correct"
-        number of records, which we don't know until we create the certificate,
-        so we are forced to hardcode that we expect 2 records (one for the main
-        domain, one for the wildcard subdomain)
-        """
 
-        self.certificate_validation: aws.acm.CertificateValidation = (
-            aws.acm.CertificateValidation(
+            # idx must be bound as a default argument; the lambdas run after the
+            # comprehension has finished, so closing over idx would see only the
+            # last index
+            self.validation_records: List[aws.route53.Record] = [
+                aws.route53.Record(
+                    f"{resource_name}-validation-record-{idx}",
+                    allow_overwrite=True,
+                    name=validation_options.apply(
+                        lambda opts, idx=idx: opts[idx]["name"]
+                    ),
+                    records=[
+                        validation_options.apply(
+                            lambda opts, idx=idx: opts[idx]["value"]
+                        )
+                    ],
+                    ttl=60,
+                    type=validation_options.apply(
+                        lambda opts, idx=idx: opts[idx]["type"]
+                    ),
+                    zone_id=self.route53_zone_id,
+                )
+                for idx in range(2)
+            ]
+            """The validation records required to show the amazon certificate manager
+            that we indeed own the domain. Pulumi doesn't let us create the "correct"
+            number of records, which we don't know until we create the certificate,
+            so we are forced to hardcode that we expect 2 records (one for the main
+            domain, one for the wildcard subdomain)
+            """
+
+            self.certificate_validation: Optional[
+                aws.acm.CertificateValidation
+            ] = aws.acm.CertificateValidation(
                 f"{resource_name}-cert-validation",
                 certificate_arn=self.certificate.arn,
                 validation_record_fqdns=[
                     record.fqdn for record in self.validation_records
                 ],
             )
-        )
-        """The confirmation that the amazon certificate manager is satisfied with
-        our ownership over the domain and hence will issue us certificates for it.
-        """
+            """The confirmation that the amazon certificate manager is satisfied with
+            our ownership over the domain and hence will issue us certificates for it.
+            None if an existing certificate was provided.
+            """
+
+            self.certificate_arn: pulumi.Output[str] = self.certificate.arn
+            """The arn of the certificate the load balancer serves"""
+        else:
+            self.certificate = None
+            self.validation_records = []
+            self.certificate_validation = None
+            self.certificate_arn = pulumi.Output.from_input(certificate_arn)
 
         self.lb_tls_listener: aws.alb.Listener = aws.alb.Listener(
             f"{resource_name}-alb-tls-listener",
@@ -176,7 +221,7 @@ class TransportLayerSecurity:
             port="443",
             protocol="HTTPS",
             ssl_policy="ELBSecurityPolicy-FS-1-2-Res-2020-10",
-            certificate_arn=self.certificate.arn,
+            certificate_arn=self.certificate_arn,
             default_actions=[
                 aws.alb.ListenerDefaultActionArgs(
                     type="forward", target_group_arn=self.target_group.arn
@@ -194,9 +239,7 @@ class TransportLayerSecurity:
                     aws.alb.ListenerRuleActionArgs(
                         type="redirect",
                         redirect=aws.alb.ListenerRuleActionRedirectArgs(
-                            host=pulumi.Output.from_input(domain).apply(
-                                lambda d: d.rstrip(".")
-                            ),
+                            host=domain_without_trailing_dot,
                             path="/#{path}",
                             query="#{query}",
                             port="443",
@@ -208,11 +251,7 @@ class TransportLayerSecurity:
                 conditions=[
                     aws.lb.ListenerRuleConditionArgs(
                         host_header=aws.lb.ListenerRuleConditionHostHeaderArgs(
-                            values=[
-                                pulumi.Output.from_input(domain).apply(
-                                    lambda d: f"www.{d.rstrip('.')}"
-                                )
-                            ]
+                            values=[f"www.{domain_without_trailing_dot}"]
                         )
                     )
                 ],
@@ -238,8 +277,8 @@ class TransportLayerSecurity:
 
         self.lb_www_v4_record: aws.route53.Record = aws.route53.Record(
             f"{resource_name}-lb-www-v4-record",
-            zone_id=self.route53_zone.zone_id,
-            name=pulumi.Output.from_input(domain).apply(lambda d: f"www.{d}"),
+            zone_id=self.route53_zone_id,
+            name=f"www.{domain}",
             type="A",
             aliases=[
                 aws.route53.RecordAliasArgs(
@@ -253,8 +292,8 @@ class TransportLayerSecurity:
 
         self.lb_www_v6_record: aws.route53.Record = aws.route53.Record(
             f"{resource_name}-lb-www-v6-record",
-            zone_id=self.route53_zone.zone_id,
-            name=pulumi.Output.from_input(domain).apply(lambda d: f"www.{d}"),
+            zone_id=self.route53_zone_id,
+            name=f"www.{domain}",
             type="AAAA",
             aliases=[
                 aws.route53.RecordAliasArgs(
@@ -268,7 +307,7 @@ class TransportLayerSecurity:
 
         self.lb_v4_record: aws.route53.Record = aws.route53.Record(
             f"{resource_name}-lb-v4-record",
-            zone_id=self.route53_zone.zone_id,
+            zone_id=self.route53_zone_id,
             name=domain,
             type="A",
             aliases=[
@@ -283,7 +322,7 @@ class TransportLayerSecurity:
 
         self.lb_v6_record: aws.route53.Record = aws.route53.Record(
             f"{resource_name}-lb-v6-record",
-            zone_id=self.route53_zone.zone_id,
+            zone_id=self.route53_zone_id,
             name=domain,
             type="AAAA",
             aliases=[
@@ -1,5 +1,6 @@
 """Constructs the virtual private cloud and subnets for the infrsstructure"""
-from typing import List
+from typing import Dict, List
+import functools
 import pulumi
 import pulumi_aws as aws
 from key import Key
@@ -8,6 +9,42 @@ import json
 AVAILABILITY_ZONES = ["us-west-2b", "us-west-2c", "us-west-2d"]
 """The availability zones which we use"""
 
+PUBLIC_SUBNET_CIDRS = ["10.0.1.0/24", "10.0.3.0/24", "10.0.5.0/24"]
+"""The cidr block of the public subnet in each availability zone, in the same
+order as AVAILABILITY_ZONES"""
+
+PRIVATE_SUBNET_CIDRS = ["10.0.2.0/24", "10.0.4.0/24", "10.0.6.0/24"]
+"""The cidr block of the private subnet in each availability zone, in the same
+order as AVAILABILITY_ZONES"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_ami(
+    name: str, architecture: str, owner: str
+) -> pulumi.Output[aws.ec2.GetAmiResult]:
+    """Looks up the most recent hvm ami matching the given name pattern. This
+    uses the output form of the lookup so that pulumi can perform the lookups
+    concurrently rather than blocking the program on each, and is memoized so
+    that every component using the same image shares one lookup.
+
+    Args:
+        name (str): the name pattern of the ami, e.g., "amzn2-ami-*"
+        architecture (str): the architecture of the ami, e.g., "arm64"
+        owner (str): the account id of the owner of the ami
+
+    Returns:
+        pulumi.Output[aws.ec2.GetAmiResult]: the ami
+    """
+    return aws.ec2.get_ami_output(
+        most_recent=True,
+        filters=[
+            aws.ec2.GetAmiFilterArgs(name="name", values=[name]),
+            aws.ec2.GetAmiFilterArgs(name="virtualization-type", values=["hvm"]),
+            aws.ec2.GetAmiFilterArgs(name="architecture", values=[architecture]),
+        ],
+        owners=[owner],
+    )
+
 
 class VirtualPrivateCloud:
     """The actual VPC and corresponding subnets/route tables."""
@@ -54,9 +91,11 @@ class VirtualPrivateCloud:
                 f"{resource_name}-public-subnet-{idx}",
                 availability_zone=zone,
                 vpc_id=self.vpc.id,
-                cidr_block=f"10.0.{idx*2+1}.0/24",
+                cidr_block=cidr_block,
+            )
+            for idx, (zone, cidr_block) in enumerate(
+                zip(AVAILABILITY_ZONES, PUBLIC_SUBNET_CIDRS, strict=True)
             )
-            for idx, zone in enumerate(AVAILABILITY_ZONES)
         ]
         """The public subnets for each availability zone"""
 
@@ -65,9 +104,11 @@ class VirtualPrivateCloud:
                 f"{resource_name}-private-subnet-{idx}",
                 availability_zone=zone,
                 vpc_id=self.vpc.id,
-                cidr_block=f"10.0.{idx*2+2}.0/24",
+                cidr_block=cidr_block,
+            )
+            for idx, (zone, cidr_block) in enumerate(
+                zip(AVAILABILITY_ZONES, PRIVATE_SUBNET_CIDRS, strict=True)
             )
-            for idx, zone in enumerate(AVAILABILITY_ZONES)
         ]
         """The private subnets for each availabiltiy zone"""
 
@@ -99,14 +140,8 @@ class VirtualPrivateCloud:
         ]
         """The route table association for each public subnet"""
 
-        self.nat_ami = aws.ec2.get_ami(
-            most_recent=True,
-            filters=[
-                aws.ec2.GetAmiFilterArgs(name="name", values=["fck-nat-amzn2-*"]),
-                aws.ec2.GetAmiFilterArgs(name="virtualization-type", values=["hvm"]),
-                aws.ec2.GetAmiFilterArgs(name="architecture", values=["arm64"]),
-            ],
-            owners=["568608671756"],
+        self.nat_ami: pulumi.Output[aws.ec2.GetAmiResult] = get_ami(
+            "fck-nat-amzn2-*", "arm64", "568608671756"
         )
         """The Amazon Machine Id for the NAT gateways"""
 
@@ -173,36 +208,18 @@ class VirtualPrivateCloud:
         ]
         """The route table associations for the private subnets"""
 
-        self.amazon_linux_arm64 = aws.ec2.get_ami(
-            most_recent=True,
-            filters=[
-                aws.ec2.GetAmiFilterArgs(name="name", values=["amzn2-ami-*"]),
-                aws.ec2.GetAmiFilterArgs(name="virtualization-type", values=["hvm"]),
-                aws.ec2.GetAmiFilterArgs(name="architecture", values=["arm64"]),
-            ],
-            owners=["137112412989"],
+        self.amazon_linux_arm64: pulumi.Output[aws.ec2.GetAmiResult] = get_ami(
+            "amzn2-ami-*", "arm64", "137112412989"
         )
         """The preferred arm64 ami"""
 
-        self.amazon_linux_amd64 = aws.ec2.get_ami(
-            most_recent=True,
-            filters=[
-                aws.ec2.GetAmiFilterArgs(name="name", values=["amzn2-ami-*"]),
-                aws.ec2.GetAmiFilterArgs(name="virtualization-type", values=["hvm"]),
-                aws.ec2.GetAmiFilterArgs(name="architecture", values=["x86_64"]),
-            ],
-            owners=["137112412989"],
+        self.amazon_linux_amd64: pulumi.Output[aws.ec2.GetAmiResult] = get_ami(
+            "amzn2-ami-*", "x86_64", "137112412989"
         )
         """The preferred amd64 ami"""
 
-        self.amazon_linux_bleeding_arm64 = aws.ec2.get_ami(
-            most_recent=True,
-            filters=[
-                aws.ec2.GetAmiFilterArgs(name="name", values=["al2023-ami-20*"]),
-                aws.ec2.GetAmiFilterArgs(name="virtualization-type", values=["hvm"]),
-                aws.ec2.GetAmiFilterArgs(name="architecture", values=["arm64"]),
-            ],
-            owners=["137112412989"],
+        self.amazon_linux_bleeding_arm64: pulumi.Output[aws.ec2.GetAmiResult] = get_ami(
+            "al2023-ami-20*", "arm64", "137112412989"
         )
         """The bleeding edge arm64 ami, for if the preferred one is too out of date"""
 
@@ -325,14 +342,22 @@ class VirtualPrivateCloud:
         )
         """The bastion server which can connect to the instances"""
 
-        pulumi.export(
-            f"{resource_name}-amazon-linux-arm64-ami", self.amazon_linux_arm64.id
-        )
-        pulumi.export(
-            f"{resource_name}-amazon-linux-amd64-ami", self.amazon_linux_amd64.id
+        self.bastion_cidr: pulumi.Output[str] = pulumi.Output.concat(
+            self.bastion.private_ip, "/32"
         )
-        pulumi.export(
-            f"{resource_name}-bleeding-edge-arm64-ami",
-            self.amazon_linux_bleeding_arm64.id,
-        )
-        pulumi.export(f"{resource_name} bastion", self.bastion.public_ip)
+        """The cidr block matching only the bastion, for allowing ssh from the
+        bastion in security groups"""
+
+    def exports(self) -> Dict[str, pulumi.Output[str]]:
+        """The stack outputs describing this virtual private cloud, keyed by
+        output name, for the program to export
+
+        Returns:
+            Dict[str, pulumi.Output[str]]: the outputs to export
+        """
+        return {
+            f"{self.resource_name}-amazon-linux-arm64-ami": self.amazon_linux_arm64.id,
+            f"{self.resource_name}-amazon-linux-amd64-ami": self.amazon_linux_amd64.id,
+            f"{self.resource_name}-bleeding-edge-arm64-ami": self.amazon_linux_bleeding_arm64.id,
+            f"{self.resource_name} bastion": self.bastion.public_ip,
+        }
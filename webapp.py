@@ -7,7 +7,7 @@ from typing import List, Optional, Literal
 from pulumi import ResourceOptions
 import pulumi
 import pulumi_aws as aws
-from vpc import VirtualPrivateCloud
+from vpc import VirtualPrivateCloud, get_ami
 from key import Key
 from remote_executor import RemoteExecution, RemoteExecutionInputs
 
@@ -101,34 +101,10 @@ class Webapp:
         self.num_instances_per_subnet = num_instances_per_subnet
         """How many instances of the application to install in each subnet"""
 
-        self.ami: aws.ec2.Ami = (
-            aws.ec2.get_ami(
-                most_recent=True,
-                filters=[
-                    aws.ec2.GetAmiFilterArgs(name="name", values=["amzn2-ami-*"]),
-                    aws.ec2.GetAmiFilterArgs(
-                        name="virtualization-type", values=["hvm"]
-                    ),
-                    aws.ec2.GetAmiFilterArgs(
-                        name="architecture", values=[architecture]
-                    ),
-                ],
-                owners=["137112412989"],
-            )
-            if not bleeding_ami
-            else aws.ec2.get_ami(
-                most_recent=True,
-                filters=[
-                    aws.ec2.GetAmiFilterArgs(name="name", values=["al2023-ami-20*"]),
-                    aws.ec2.GetAmiFilterArgs(
-                        name="virtualization-type", values=["hvm"]
-                    ),
-                    aws.ec2.GetAmiFilterArgs(
-                        name="architecture", values=[architecture]
-                    ),
-                ],
-                owners=["137112412989"],
-            )
+        self.ami: pulumi.Output[aws.ec2.GetAmiResult] = get_ami(
+            "al2023-ami-20*" if bleeding_ami else "amzn2-ami-*",
+            architecture,
+            "137112412989",
         )
         """The amazon machine id that the instances use"""
 
@@ -195,6 +171,11 @@ class Webapp:
         actually installs the web application; the configuration often depends on
         the instances themselves, such as their ip, hence why this is a separate step.
 
+        This only registers the remote executions and returns immediately; the
+        installs themselves are scheduled by the pulumi engine, which runs them
+        in parallel with the installs of other webapps since they only depend
+        on this webapps instances and the private route table associations.
+
         Args:
             configuration (str): The shell code to install under "environment.sh"
                 for the webapp under the home directory, which is executed